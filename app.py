@@ -1,8 +1,27 @@
 import os 
-import pyodbc
-from flask import Flask, jsonify, request, render_template 
+from flask import Flask, g, jsonify, request, render_template 
 from flask_cors import CORS
 import json
+import hmac
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+
+from werkzeug.datastructures import MultiDict
+
+from backends import crear_backend
+from catalogo import CatalogoVistas, VistaNoEncontrada, leer_claves
+from consultas import (
+    ConsultaReporte, ParametroInvalido, columnas_desde_descripcion, construir_consulta,
+    tiene_parametros,
+)
+from db_pool import ConnectionPool, PoolAgotadoError
+from exportacion import EXPORTADORES
+from formatos import MIMETYPE_JSON, codificaciones_disponibles, filas_columnares, metadatos_columnas, serializar_columnar
+from metricas import Metricas, estadisticas_prometheus
+from report_cache import ReportCache
 
 # Ruta absoluta de templates
 # El canvas de desarrollo usa un sistema de archivos virtual, pero esta línea
@@ -37,46 +56,305 @@ CONNECTION_STRING = (
     f"Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;"
 )
 
+# --- Backend de base de datos ---
+# 'sqlserver' (Azure SQL con pyodbc) o 'sqlite' (base local generada con base_local.py, sin pyodbc)
+DB_BACKEND = os.environ.get('DB_BACKEND', 'sqlserver')
+DB_SQLITE_PATH = os.environ.get('DB_SQLITE_PATH', 'reportes.sqlite')
+
+if DB_BACKEND == 'sqlite':
+    backend = crear_backend('sqlite', ruta=DB_SQLITE_PATH)
+else:
+    backend = crear_backend(DB_BACKEND, connection_string=CONNECTION_STRING)
+
+# Clase base de los errores del driver (pyodbc.Error o sqlite3.Error)
+ErrorBD = backend.Error
+
+# --- Métricas de rendimiento ---
+# Tiempos por fase (cabecera Server-Timing), histogramas por endpoint/vista y GET /metrics (Prometheus)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+# Registra en el log las consultas que tarden más de N milisegundos (sin definir: deshabilitado)
+SLOW_QUERY_MS = os.environ.get('SLOW_QUERY_MS')
+
+metricas = Metricas(
+    habilitado=METRICS_ENABLED,
+    umbral_lento=float(SLOW_QUERY_MS) / 1000 if SLOW_QUERY_MS else None,
+)
+
+# --- Pool de conexiones ---
+# Reutiliza las conexiones para no repetir el handshake TCP + TLS + login en cada petición.
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '0'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))              # Espera máxima por una conexión libre (s)
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))           # Cierra conexiones inactivas más de N s
+DB_POOL_PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))  # Verifica la conexión si estuvo inactiva N s
+
+
+def crear_conexion():
+    """Fábrica de conexiones usada por el pool."""
+    with metricas.fase('connect'):
+        return backend.conectar()
+
+
+pool = ConnectionPool(
+    crear_conexion,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    max_idle=DB_POOL_MAX_IDLE,
+    ping_interval=DB_POOL_PING_INTERVAL,
+)
+
+
+@contextmanager
+def conexion_bd():
+    """Como pool.connection(), midiendo la espera por la conexión (fase 'acquire'; incluye 'connect' si se abre una nueva)."""
+    with metricas.fase('acquire'):
+        conn = pool.acquire()
+    try:
+        yield conn
+    except BaseException:
+        pool.release(conn, discard=True)
+        raise
+    pool.release(conn)
+
+
+def _prellenar_pool():
+    try:
+        pool.prefill()
+    except Exception as ex:
+        app.logger.warning(f"No se pudo prellenar el pool de conexiones: {ex}")
+
+
+if DB_POOL_MIN_SIZE > 0:
+    # En segundo plano para no bloquear el arranque si la base de datos no responde
+    threading.Thread(target=_prellenar_pool, name='db-pool-prefill', daemon=True).start()
+
+# --- Caché de reportes ---
+# Evita repetir la misma consulta cuando varios usuarios abren el mismo reporte de la misma empresa.
+REPORT_CACHE_TTL = float(os.environ.get('REPORT_CACHE_TTL', '300'))                          # Segundos; 0 deshabilita
+REPORT_CACHE_MAX_BYTES = int(os.environ.get('REPORT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))  # Límite de memoria
+# El endpoint de invalidación exige la cabecera 'X-Admin-Token' con este valor; sin definir responde 403
+CACHE_ADMIN_TOKEN = os.environ.get('CACHE_ADMIN_TOKEN')
+
+report_cache = ReportCache(max_bytes=REPORT_CACHE_MAX_BYTES, ttl=REPORT_CACHE_TTL)
+
+
+class ErrorReporte(Exception):
+    """Error de consulta de un reporte; transporta el diccionario de error de ejecutar_select_query."""
+
+    def __init__(self, resultado):
+        super().__init__(resultado.get('message'))
+        self.resultado = resultado
+
+# --- Catálogo de vistas ---
+# Lista opcional de vistas permitidas (separadas por coma); sin definir se exponen todas las vistas de dbo
+REPORT_VIEWS = [nombre.strip() for nombre in os.environ.get('REPORT_VIEWS', '').split(',') if nombre.strip()]
+VIEW_CATALOG_REFRESH = float(os.environ.get('VIEW_CATALOG_REFRESH', '300'))  # Segundos entre refrescos; 0 solo al iniciar
+# Clave única de las vistas que se pueden paginar (?limit=/cursor), p.ej. 'view_Movimientos_Cuentas:Id,otra:Col1+Col2'.
+# Las vistas sin clave se devuelven completas: ordenar por columnas que se repiten perdería filas entre páginas.
+REPORT_VIEW_KEYS = leer_claves(os.environ.get('REPORT_VIEW_KEYS', 'view_Movimientos_Cuentas:Id'))
+
+
+def cargar_catalogo():
+    """Lee las columnas de las vistas (INFORMATION_SCHEMA en SQL Server; ver backends.py)."""
+    with conexion_bd() as conn:
+        return backend.leer_catalogo(conn)
+
+
+def _vistas_modificadas(nombres):
+    # Las respuestas cacheadas de una vista que cambió de columnas ya no son válidas
+    for nombre in nombres:
+        report_cache.invalidate(view_name=nombre)
+
+
+catalogo = CatalogoVistas(
+    cargar_catalogo, permitidas=REPORT_VIEWS, claves=REPORT_VIEW_KEYS, al_cambiar=_vistas_modificadas,
+)
+# En segundo plano para no bloquear el arranque; si aún no cargó, la primera petición lo carga
+catalogo.iniciar_refresco(VIEW_CATALOG_REFRESH)
+
+# Filas por lote al transmitir reportes grandes (fetchmany)
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '1000'))
+# Máximo de filas por página en la paginación del servidor (?limit=)
+REPORT_PAGE_MAX = int(os.environ.get('REPORT_PAGE_MAX', '5000'))
+
+# --- Consultas en lote (POST /api/reportes) ---
+# Conviene que BATCH_MAX_WORKERS no supere DB_POOL_MAX_SIZE para no esperar conexiones.
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', '4'))
+BATCH_QUERY_TIMEOUT = float(os.environ.get('BATCH_QUERY_TIMEOUT', '60'))  # Segundos por consulta
+BATCH_MAX_PARTES = int(os.environ.get('BATCH_MAX_PARTES', '20'))         # Máximo de vistas x empresas por petición
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='reportes-batch')
+
 # --- Funciones de Acceso a la Base de Datos (Solo para SELECT) ---
 
+def _procesar_fila(row):
+    """Asegura la serialización JSON de una fila (convierte non-None a str)."""
+    return [str(item) if item is not None else item for item in row]
+
+
+def _resultado_error(ex):
+    """Traduce una excepción de acceso a datos al diccionario de error que devuelven los endpoints."""
+    if isinstance(ex, PoolAgotadoError):
+        app.logger.error(f"Pool de conexiones agotado: {ex}")
+        return {"status": "error", "message": "Servidor ocupado: no hay conexiones disponibles a la base de datos.", "detail": str(ex)}
+
+    error_msg = str(ex)
+    message = (
+        "Error CRÍTICO de SQL (Login Failed/Firewall/Driver/Query): "
+        f"Detalle: {error_msg}"
+    )
+    app.logger.error(message)
+    # Devolvemos un error con detalle para facilitar la depuración
+    if backend.error_de_conexion(error_msg):
+         return {"status": "error", "message": "Fallo de Conexión/Credenciales/Driver. Revise las variables de entorno.", "detail": error_msg}
+    return {"status": "error", "message": message}
+
+
 def ejecutar_select_query(query, params=None):
     """
     Función genérica para ejecutar una query SELECT (incluyendo filtros WHERE).
     Garantiza la seguridad mediante el uso de parámetros para evitar inyección SQL.
     """
-    conn = None
     try:
-        conn = pyodbc.connect(CONNECTION_STRING)
-        cursor = conn.cursor()
-        
-        # Ejecutar la query con parámetros para seguridad
-        cursor.execute(query, params or [])
-        
-        column_names = [column[0] for column in cursor.description] if cursor.description else []
-        
-        reporte_data = []
-        for row in cursor.fetchall():
-            # Convertir a diccionario y asegurar la serialización JSON (convierte non-None a str)
-            processed_row = [str(item) if item is not None else item for item in row]
-            reporte_data.append(dict(zip(column_names, processed_row)))
+        # La conexión se descarta automáticamente si ocurre un error durante su uso
+        with conexion_bd() as conn:
+            cursor = conn.cursor()
+            inicio = time.perf_counter()
+
+            # Ejecutar la query con parámetros para seguridad
+            with metricas.fase('execute'):
+                cursor.execute(query, params or [])
+
+            column_names = [column[0] for column in cursor.description] if cursor.description else []
+
+            with metricas.fase('fetch'):
+                filas = cursor.fetchall()
+            cursor.close()
+            metricas.consulta_finalizada(query, params, time.perf_counter() - inicio)
+            metricas.contar_filas(len(filas))
+
+        with metricas.fase('convert'):
+            # Convertir a diccionario y asegurar la serialización JSON
+            reporte_data = [dict(zip(column_names, _procesar_fila(row))) for row in filas]
 
         return {"status": "success", "query": query, "data": reporte_data}
 
-    except pyodbc.Error as ex:
-        error_msg = str(ex)
-        message = (
-            "Error CRÍTICO de SQL (Login Failed/Firewall/Driver/Query): "
-            f"Detalle: {error_msg}"
-        )
-        app.logger.error(message)
-        # Devolvemos un error con detalle para facilitar la depuración
-        if 'Login failed' in error_msg or 'ODBC Driver' in error_msg or 'firewall' in error_msg:
-             return {"status": "error", "message": "Fallo de Conexión/Credenciales/Driver. Revise las variables de entorno.", "detail": error_msg}
-        return {"status": "error", "message": message}
-        
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _resultado_error(ex)
+
+
+def ejecutar_consulta_reporte(consulta, timeout=None):
+    """
+    Ejecuta una ConsultaReporte (paginada, proyectada y/o filtrada) y devuelve el resultado
+    crudo: columnas tipadas y filas sin convertir, más el cursor de la página siguiente
+    (si se paginó) y el total de filas (si se pidió). La serialización depende del formato
+    solicitado (ver _serializar_reporte). ``timeout`` limita la duración de la consulta en segundos.
+    """
+    try:
+        with conexion_bd() as conn:
+            if timeout:
+                backend.aplicar_timeout(conn, timeout)
+            cursor = conn.cursor()
+            inicio = time.perf_counter()
+            with metricas.fase('execute'):
+                cursor.execute(consulta.sql, consulta.params)
+            # Tipos del catálogo; cursor.description solo si la consulta no los trae
+            columnas = (consulta.columnas or columnas_desde_descripcion(cursor.description))[:consulta.visibles]
+            with metricas.fase('fetch'):
+                filas = cursor.fetchall()
+            metricas.consulta_finalizada(consulta.sql, consulta.params, time.perf_counter() - inicio)
+            metricas.contar_filas(len(filas))
+
+            total = None
+            if consulta.sql_total:
+                inicio = time.perf_counter()
+                with metricas.fase('count'):
+                    cursor.execute(consulta.sql_total, consulta.params_total)
+                    total = cursor.fetchone()[0]
+                metricas.consulta_finalizada(consulta.sql_total, consulta.params_total, time.perf_counter() - inicio)
+            cursor.close()
+            if timeout:
+                # La conexión vuelve al pool: restaurar el valor por defecto
+                backend.aplicar_timeout(conn, None)
+
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _resultado_error(ex)
+
+    # El cursor siguiente se calcula con los valores crudos, antes de serializarlos
+    filas, siguiente = consulta.paginar(filas)
+    resultado = {"status": "success", "query": consulta.sql, "columnas": columnas, "filas": filas}
+    if consulta.limite is not None:
+        resultado["next_cursor"] = siguiente
+    if consulta.sql_total:
+        resultado["total"] = total
+    return resultado
+
+
+def _serializar_reporte(resultado, layout, mimetype):
+    """
+    Serializa el resultado crudo de ejecutar_consulta_reporte:
+    'rows' (por defecto) -> un diccionario de strings por fila;
+    'columnar' -> metadatos de columnas una vez y filas como arrays tipados (JSON, MessagePack o Arrow).
+    """
+    if layout == 'rows' and mimetype == MIMETYPE_JSON:
+        column_names = [columna.nombre for columna in resultado["columnas"]]
+        with metricas.fase('convert'):
+            documento = {
+                "status": "success",
+                "query": resultado["query"],
+                "data": [dict(zip(column_names, _procesar_fila(row))) for row in resultado["filas"]],
+            }
+        for clave in ("next_cursor", "total"):
+            if clave in resultado:
+                documento[clave] = resultado[clave]
+        with metricas.fase('serialize'):
+            return app.json.dumps(documento).encode('utf-8')
+    # En el formato columnar la conversión de valores y la codificación se miden juntas
+    with metricas.fase('serialize'):
+        return serializar_columnar(resultado, mimetype)
+
+
+def iterar_select_query(query, params=None, batch_size=None, columnas=None):
+    """
+    Generador para reportes grandes: primero produce las columnas (Columna; las de
+    ``columnas`` si se indican, o las de cursor.description) y luego lotes de filas
+    crudas obtenidos con fetchmany, manteniendo acotada la memoria.
+
+    Si el consumidor abandona el generador antes de terminar (p.ej. el cliente se
+    desconecta), la conexión se descarta en lugar de devolverse al pool con un
+    resultado pendiente.
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    # La respuesta se transmite después de terminar la petición: se conserva la medición explícitamente
+    medicion = metricas.actual()
+    with metricas.fase('acquire', medicion):
+        conn = pool.acquire()
+    completo = False
+    try:
+        cursor = conn.cursor()
+        inicio = time.perf_counter()
+        with metricas.fase('execute', medicion):
+            cursor.execute(query, params or [])
+        # Tiempo en la base de datos (execute + fetchmany); el envío al cliente entre lotes queda fuera
+        duracion = time.perf_counter() - inicio
+        yield columnas or columnas_desde_descripcion(cursor.description)
+
+        while True:
+            inicio = time.perf_counter()
+            with metricas.fase('fetch', medicion):
+                filas = cursor.fetchmany(batch_size)
+            duracion += time.perf_counter() - inicio
+            if not filas:
+                break
+            metricas.contar_filas(len(filas), medicion)
+            yield filas
+
+        cursor.close()
+        completo = True
+        metricas.consulta_finalizada(query, params, duracion, medicion)
     finally:
-        if conn:
-            conn.close()
+        pool.release(conn, discard=not completo)
 
 @app.route('/')
 def home():
@@ -96,7 +374,8 @@ def obtener_empresas_api():
     if resultado['status'] == 'error':
         return jsonify(resultado), 500
         
-    return jsonify(resultado)
+    with metricas.fase('serialize'):
+        return jsonify(resultado)
 
 # --- RUTA GENÉRICA PARA OBTENER DATOS DE CUALQUIER VISTA CON FILTRO ---
 
@@ -116,25 +395,533 @@ def reporte_vista_api(view_name):
     if not empresa_id:
          return jsonify({"status": "error", "message": "Filtro: empresa_id es requerido."}), 400
 
-    # 1. Construir la consulta SELECT usando el nombre de la vista y un placeholder '?'
-    # Asumimos que todas las vistas relevantes tienen una columna llamada 'Empresa' que apunta a REG_Empresa
-    query = f"SELECT * FROM dbo.{view_name} WHERE Empresa = ?"
-    
-    # 2. Ejecutar la consulta con el parámetro de seguridad
-    resultado = ejecutar_select_query(query, params=[empresa_id])
-    
-    # Manejo de errores específico
-    if resultado['status'] == 'error':
-        # Error 404 si la vista no existe
-        if 'Invalid object name' in resultado.get('detail', ''):
-             return jsonify({
-                "status": "error", 
-                "message": f"Error: La vista '{view_name}' no existe o no se encontró.",
-                "detail": resultado['detail']
-             }), 404
-        return jsonify(resultado), 500 # Otros errores de SQL/Conexión
-    
-    return jsonify(resultado)
+    formato = request.args.get('format', 'json')
+    if formato != 'json' and formato not in FORMATOS_STREAMING:
+        return jsonify({"status": "error", "message": f"Formato no soportado: '{formato}'."}), 400
+
+    # Disposición de las filas: 'rows' (diccionarios de strings) o 'columnar' (arrays tipados)
+    layout = request.args.get('layout', 'rows')
+    if layout not in ('rows', 'columnar'):
+        return jsonify({"status": "error", "message": f"Layout no soportado: '{layout}'."}), 400
+
+    # Codificación binaria opcional negociada por la cabecera Accept (implica layout columnar)
+    mimetype = request.accept_mimetypes.best_match(codificaciones_disponibles(), default=MIMETYPE_JSON)
+
+    # 1. Construir la consulta (SELECT filtrado por empresa, con los parámetros opcionales de la URL)
+    try:
+        view_name, consulta = preparar_consulta(
+            view_name, empresa_id, request.args, paginar=formato not in FORMATOS_STREAMING,
+        )
+    except VistaNoEncontrada:
+        return _respuesta_vista_no_encontrada(view_name)
+    except ParametroInvalido as ex:
+        return jsonify({"status": "error", "message": str(ex)}), 400
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _respuesta_error_vista(view_name, _resultado_error(ex))
+
+    if formato in FORMATOS_STREAMING:
+        return _respuesta_streaming(view_name, consulta, formato, layout)
+
+    # 2. Ejecutar la consulta (o reutilizar la respuesta cacheada)
+    try:
+        entrada, hit = obtener_reporte(
+            view_name, empresa_id, consulta, _parametros_cache(request.args), layout, mimetype,
+        )
+    except ErrorReporte as ex:
+        return _respuesta_error_vista(view_name, ex.resultado)
+
+    return _respuesta_cacheada(entrada, hit)
+
+
+def preparar_consulta(view_name, empresa_id, args, paginar=True):
+    """
+    Construye la ConsultaReporte de una vista del catálogo. Sin parámetros extra es el SELECT
+    precompilado filtrado por empresa; con paginación, proyección, orden o filtros se validan
+    contra las columnas de la vista. Devuelve ``(nombre, consulta)`` con el nombre de la vista
+    tal como está en el catálogo (la URL no distingue mayúsculas). Lanza VistaNoEncontrada,
+    ParametroInvalido, o el error de base de datos si el catálogo aún no estaba cargado y no se pudo leer.
+    """
+    vista = catalogo.obtener(view_name)
+    view_name = vista.nombre
+    metricas.etiquetar(view_name)
+    if not vista.tiene_empresa:
+        raise ParametroInvalido(f"La vista '{view_name}' no tiene la columna Empresa; no se puede filtrar por empresa.")
+
+    if not tiene_parametros(args):
+        consulta = ConsultaReporte(vista.sql, [empresa_id], columnas=vista.columnas, visibles=None, orden=[], limite=None)
+        return view_name, consulta
+
+    return view_name, construir_consulta(
+        view_name, vista.columnas, empresa_id, args, limite_maximo=REPORT_PAGE_MAX, paginar=paginar,
+        dialecto=backend.dialecto, clave=vista.clave,
+    )
+
+
+def obtener_reporte(view_name, empresa_id, consulta, params_clave, layout, mimetype, timeout=None):
+    """
+    Devuelve ``(entrada, hit)`` con el cuerpo serializado del reporte, desde la caché o ejecutando
+    la consulta (una sola vez para peticiones concurrentes). Lanza ErrorReporte si la consulta falla.
+    """
+    def cargar_reporte():
+        resultado = ejecutar_consulta_reporte(consulta, timeout=timeout)
+        if resultado['status'] == 'error':
+            raise ErrorReporte(resultado)
+        return _serializar_reporte(resultado, layout, mimetype)
+
+    # La clave incluye los demás parámetros y la codificación para no mezclar variantes del mismo reporte
+    clave = (view_name, empresa_id, params_clave, mimetype)
+    return report_cache.get_or_load(clave, cargar_reporte, mimetype=mimetype)
+
+
+def _cuerpo_vista_no_encontrada(view_name):
+    return {"status": "error", "message": f"Error: La vista '{view_name}' no existe o no se encontró."}
+
+
+def _respuesta_vista_no_encontrada(view_name):
+    """404 para una vista que no está en el catálogo (sin consultar la base de datos)."""
+    return jsonify(_cuerpo_vista_no_encontrada(view_name)), 404
+
+
+def _estado_error(view_name, resultado):
+    """Código HTTP y cuerpo de error de un reporte: 404 si la vista no existe, 500 en otro caso."""
+    # Error 404 si la vista se eliminó después del último refresco del catálogo
+    if backend.objeto_inexistente(resultado.get('detail') or resultado.get('message', '')):
+        return 404, {
+            "status": "error",
+            "message": f"Error: La vista '{view_name}' no existe o no se encontró.",
+            "detail": resultado['detail'],
+        }
+    return 500, resultado  # Otros errores de SQL/Conexión
+
+
+def _respuesta_error_vista(view_name, resultado):
+    """Respuesta de error de un reporte: 404 si la vista no existe, 500 en otro caso."""
+    codigo, cuerpo = _estado_error(view_name, resultado)
+    return jsonify(cuerpo), codigo
+
+
+# Formatos de respuesta transmitidos por lotes:
+#   ndjson -> una línea con los metadatos y luego una línea JSON por fila
+#   stream -> el mismo JSON que la respuesta normal, pero generado por partes
+FORMATOS_STREAMING = {
+    'ndjson': 'application/x-ndjson',
+    'stream': 'application/json',
+}
+
+
+def _respuesta_streaming(view_name, consulta, formato, layout='rows'):
+    """
+    Transmite el reporte por lotes (fetchmany) sin materializarlo completo en memoria.
+    Las columnas agregadas solo para ordenar se recortan según ``consulta.visibles``.
+    """
+    lotes = iterar_select_query(consulta.sql, consulta.params, columnas=consulta.columnas)
+    try:
+        # Ejecuta la consulta antes de enviar cabeceras para poder responder con el código de error correcto
+        columnas = next(lotes)
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _respuesta_error_vista(view_name, _resultado_error(ex))
+    filas = lotes
+    visibles = consulta.visibles
+    if visibles is not None and visibles < len(columnas):
+        # Recorta las columnas agregadas solo para ordenar
+        columnas = columnas[:visibles]
+        filas = ([row[:visibles] for row in lote] for lote in lotes)
+
+    column_names = [columna.nombre for columna in columnas]
+    encabezado = {"status": "success", "query": consulta.sql}
+    if layout == 'columnar':
+        encabezado["columns"] = metadatos_columnas(columnas)
+
+        def serializar_lote(lote):
+            return [json.dumps(fila) for fila in filas_columnares(columnas, lote)]
+    else:
+        if formato == 'ndjson':
+            encabezado["columns"] = column_names
+
+        def serializar_lote(lote):
+            return [json.dumps(dict(zip(column_names, _procesar_fila(row)))) for row in lote]
+
+    clave_filas = 'rows' if layout == 'columnar' else 'data'
+
+    def generar():
+        try:
+            if formato == 'ndjson':
+                yield json.dumps(encabezado) + '\n'
+                for lote in filas:
+                    yield ''.join(linea + '\n' for linea in serializar_lote(lote))
+            else:
+                yield json.dumps(encabezado)[:-1] + f', "{clave_filas}": ['
+                separador = ''
+                for lote in filas:
+                    yield separador + ', '.join(serializar_lote(lote))
+                    separador = ', '
+                yield ']}'
+        except ErrorBD as ex:
+            resultado = _resultado_error(ex)
+            # Las cabeceras ya se enviaron: en NDJSON se informa el error como última línea;
+            # en JSON el documento queda truncado y el cliente lo detecta al parsear.
+            if formato == 'ndjson':
+                yield json.dumps(resultado) + '\n'
+        finally:
+            lotes.close()
+
+    respuesta = app.response_class(generar(), mimetype=FORMATOS_STREAMING[formato])
+    # Garantiza liberar la conexión aunque la respuesta nunca llegue a iterarse
+    respuesta.call_on_close(lotes.close)
+    respuesta.headers['Cache-Control'] = 'no-store'
+    return respuesta
+
+
+def _parametros_cache(args, exclude=('empresa_id',)):
+    """Parámetros de la consulta normalizados (ordenados) para formar la clave de caché."""
+    return tuple(sorted(
+        (clave, valor) for clave, valor in args.items(multi=True) if clave not in exclude
+    ))
+
+
+def _respuesta_cacheada(entrada, hit):
+    """Construye la respuesta con ETag/Last-Modified; responde 304 si el navegador ya tiene esa versión."""
+    respuesta = app.response_class(entrada.cuerpo, mimetype=entrada.mimetype)
+    respuesta.set_etag(entrada.etag)
+    respuesta.last_modified = entrada.last_modified
+    # 'no-cache' obliga al navegador a revalidar con If-None-Match en cada clic
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    metricas.anotar('cache', 'HIT' if hit else 'MISS')
+    # La codificación depende de la cabecera Accept
+    respuesta.vary.add('Accept')
+    return respuesta.make_conditional(request)
+
+# --- RUTA PARA EXPORTAR UNA VISTA (CSV / XLSX / PDF) ---
+
+@app.route('/api/reporte-vista/<view_name>/export', methods=['GET'])
+def exportar_reporte_api(view_name):
+    """
+    Endpoint: Exporta el reporte completo de una vista como archivo (?format=csv|xlsx|pdf).
+    Acepta los mismos filtros, proyección y orden que /api/reporte-vista/<view_name>.
+    Las filas se leen del cursor por lotes y se escriben directamente en el archivo.
+    """
+    empresa_id = request.args.get('empresa_id', type=int)
+    if not empresa_id:
+         return jsonify({"status": "error", "message": "Filtro: empresa_id es requerido."}), 400
+
+    formato = request.args.get('format', 'csv')
+    if formato not in EXPORTADORES:
+        return jsonify({"status": "error", "message": f"Formato de exportación no soportado: '{formato}'."}), 400
+    exportador, mimetype, extension = EXPORTADORES[formato]
+
+    try:
+        view_name, consulta = preparar_consulta(view_name, empresa_id, request.args, paginar=False)
+    except VistaNoEncontrada:
+        return _respuesta_vista_no_encontrada(view_name)
+    except ParametroInvalido as ex:
+        return jsonify({"status": "error", "message": str(ex)}), 400
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _respuesta_error_vista(view_name, _resultado_error(ex))
+
+    lotes = iterar_select_query(consulta.sql, consulta.params, columnas=consulta.columnas)
+    try:
+        # Ejecuta la consulta antes de enviar cabeceras para poder responder con el código de error correcto
+        columnas = next(lotes)
+        visibles = consulta.visibles
+        if visibles is not None and visibles < len(columnas):
+            # Recorta las columnas agregadas solo para ordenar
+            columnas = columnas[:visibles]
+            filas = ([row[:visibles] for row in lote] for lote in lotes)
+        else:
+            filas = lotes
+        contenido = exportador(columnas, filas, titulo=view_name.replace('view_', '').replace('_', ' '))
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return _respuesta_error_vista(view_name, _resultado_error(ex))
+
+    def generar():
+        try:
+            yield from contenido
+        except ErrorBD as ex:
+            # Las cabeceras ya se enviaron: el archivo queda truncado
+            _resultado_error(ex)
+        finally:
+            lotes.close()
+
+    respuesta = app.response_class(generar(), mimetype=mimetype)
+    respuesta.call_on_close(lotes.close)
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{view_name}_{empresa_id}.{extension}"'
+    respuesta.headers['Cache-Control'] = 'no-store'
+    return respuesta
+
+# --- RUTA PARA OBTENER VARIOS REPORTES EN UNA SOLA PETICIÓN ---
+
+@app.route('/api/reportes', methods=['POST'])
+def reportes_lote_api():
+    """
+    Endpoint: Obtiene varias vistas para una o más empresas en paralelo.
+
+    Cuerpo JSON:
+        {"vistas": ["view_Movimientos_Cuentas", ...], "empresa_ids": [1, 2],
+         "layout": "rows" | "columnar", "parametros": {"limit": 500, "total": 1}}
+
+    Los ``parametros`` se aplican a todas las vistas: ``limit``/``cursor`` solo son válidos en
+    vistas con clave única (las demás partes responden 400).
+
+    Cada combinación vista/empresa se ejecuta en un pool de hilos acotado, con su propio
+    timeout. La respuesta combina todas las partes (cada una con su 'http_status'), o con
+    '?format=ndjson' se transmite una línea por parte a medida que terminan.
+    """
+    cuerpo = request.get_json(silent=True)
+    if not isinstance(cuerpo, dict):
+        return jsonify({"status": "error", "message": "Se esperaba un cuerpo JSON."}), 400
+
+    vistas = cuerpo.get('vistas')
+    empresa_ids = cuerpo.get('empresa_ids', [cuerpo['empresa_id']] if 'empresa_id' in cuerpo else None)
+    if not vistas or not isinstance(vistas, list) or not all(isinstance(v, str) for v in vistas):
+        return jsonify({"status": "error", "message": "'vistas' debe ser una lista de nombres de vista."}), 400
+    if not empresa_ids or not isinstance(empresa_ids, list):
+        return jsonify({"status": "error", "message": "'empresa_ids' es requerido."}), 400
+    # Solo enteros JSON o strings de dígitos: se rechazan booleanos, decimales (1.7) y 1e400
+    if not all(
+        (isinstance(empresa_id, int) and not isinstance(empresa_id, bool))
+        or (isinstance(empresa_id, str) and empresa_id.isdecimal())
+        for empresa_id in empresa_ids
+    ):
+        return jsonify({"status": "error", "message": "'empresa_ids' debe contener enteros."}), 400
+    empresa_ids = [int(empresa_id) for empresa_id in empresa_ids]
+
+    partes = [(vista, empresa_id) for empresa_id in empresa_ids for vista in vistas]
+    if len(partes) > BATCH_MAX_PARTES:
+        return jsonify({
+            "status": "error",
+            "message": f"Demasiados reportes en una petición ({len(partes)}); el máximo es {BATCH_MAX_PARTES}.",
+        }), 400
+
+    layout = cuerpo.get('layout', 'rows')
+    if layout not in ('rows', 'columnar'):
+        return jsonify({"status": "error", "message": f"Layout no soportado: '{layout}'."}), 400
+
+    parametros = cuerpo.get('parametros') or {}
+    if not isinstance(parametros, dict):
+        return jsonify({"status": "error", "message": "'parametros' debe ser un objeto."}), 400
+    args = MultiDict({clave: str(valor) for clave, valor in parametros.items()})
+    if layout != 'rows':
+        args['layout'] = layout
+
+    futuros = {
+        batch_executor.submit(_parte_reporte, vista, empresa_id, args, layout): (vista, empresa_id)
+        for vista, empresa_id in partes
+    }
+    # Las partes se ejecutan en tandas de BATCH_MAX_WORKERS: el plazo total escala con las tandas
+    plazo = BATCH_QUERY_TIMEOUT * math.ceil(len(partes) / BATCH_MAX_WORKERS)
+
+    if request.args.get('format') == 'ndjson':
+        return app.response_class(_lote_ndjson(futuros, plazo), mimetype='application/x-ndjson')
+
+    terminados = {}
+    try:
+        for futuro in as_completed(futuros, timeout=plazo):
+            terminados[futuros[futuro]] = futuro.result()
+    except FuturesTimeoutError:
+        _cancelar_pendientes(futuros)
+
+    piezas = [
+        _pieza_lote(vista, empresa_id, *terminados.get((vista, empresa_id), _PARTE_VENCIDA))
+        for vista, empresa_id in partes
+    ]
+    codigos = [terminados.get(parte, _PARTE_VENCIDA)[0] for parte in partes]
+    if all(codigo == 200 for codigo in codigos):
+        estado = 'success'
+    elif any(codigo == 200 for codigo in codigos):
+        estado = 'partial'
+    else:
+        estado = 'error'
+
+    # Los cuerpos ya serializados (posiblemente cacheados) se incrustan sin volver a parsearlos
+    respuesta = b'{"status":"' + estado.encode() + b'","resultados":[' + b','.join(piezas) + b']}'
+    return app.response_class(respuesta, mimetype='application/json')
+
+
+_PARTE_VENCIDA = (504, json.dumps({
+    "status": "error", "message": "La consulta excedió el tiempo máximo permitido.",
+}).encode('utf-8'))
+
+
+def _parte_reporte(view_name, empresa_id, args, layout):
+    """Ejecuta una parte del lote (con su propia medición); devuelve ``(codigo_http, cuerpo_json)``."""
+    medicion, token = metricas.iniciar('reportes_lote_parte')
+    codigo = 500
+    try:
+        codigo, cuerpo = _ejecutar_parte(view_name, empresa_id, args, layout)
+        if medicion is not None:
+            medicion.bytes = len(cuerpo)
+        return codigo, cuerpo
+    finally:
+        metricas.soltar(token)
+        metricas.finalizar(medicion, codigo)
+
+
+def _ejecutar_parte(view_name, empresa_id, args, layout):
+    """Ejecuta una parte del lote; devuelve ``(codigo_http, cuerpo_json)`` sin lanzar excepciones."""
+    try:
+        view_name, consulta = preparar_consulta(view_name, empresa_id, args)
+        entrada, _ = obtener_reporte(
+            view_name, empresa_id, consulta, _parametros_cache(args), layout, MIMETYPE_JSON,
+            timeout=BATCH_QUERY_TIMEOUT,
+        )
+        return 200, entrada.cuerpo
+    except VistaNoEncontrada:
+        return 404, json.dumps(_cuerpo_vista_no_encontrada(view_name)).encode('utf-8')
+    except ParametroInvalido as ex:
+        return 400, json.dumps({"status": "error", "message": str(ex)}).encode('utf-8')
+    except (PoolAgotadoError, ErrorBD) as ex:
+        codigo, cuerpo = _estado_error(view_name, _resultado_error(ex))
+    except ErrorReporte as ex:
+        codigo, cuerpo = _estado_error(view_name, ex.resultado)
+    except Exception as ex:
+        app.logger.exception(f"Error inesperado en el lote ({view_name}, {empresa_id})")
+        codigo, cuerpo = 500, {"status": "error", "message": f"Error inesperado: {ex}"}
+    return codigo, json.dumps(cuerpo).encode('utf-8')
+
+
+def _pieza_lote(view_name, empresa_id, codigo, cuerpo):
+    encabezado = json.dumps({"vista": view_name, "empresa_id": empresa_id, "http_status": codigo})
+    return encabezado[:-1].encode('utf-8') + b',"respuesta":' + cuerpo + b'}'
+
+
+def _cancelar_pendientes(futuros):
+    # Las que aún no empezaron se cancelan; las que ya corren terminan por el timeout del driver
+    for futuro in futuros:
+        futuro.cancel()
+
+
+def _lote_ndjson(futuros, plazo):
+    """Transmite una línea por parte a medida que terminan; las vencidas se informan al final."""
+    pendientes = dict(futuros)
+    try:
+        for futuro in as_completed(futuros, timeout=plazo):
+            vista, empresa_id = pendientes.pop(futuro)
+            yield _pieza_lote(vista, empresa_id, *futuro.result()) + b'\n'
+    except FuturesTimeoutError:
+        for vista, empresa_id in pendientes.values():
+            yield _pieza_lote(vista, empresa_id, *_PARTE_VENCIDA) + b'\n'
+    finally:
+        # También si el cliente se desconecta a mitad de la respuesta
+        _cancelar_pendientes(pendientes)
+
+# --- RUTA DEL CATÁLOGO DE VISTAS ---
+
+@app.route('/api/views', methods=['GET'])
+def catalogo_vistas_api():
+    """Endpoint: Lista las vistas disponibles con sus columnas (nombre, tipo y escala) y su clave de paginación."""
+    try:
+        if not catalogo.cargado:
+            catalogo.refrescar()
+    except (PoolAgotadoError, ErrorBD) as ex:
+        return jsonify(_resultado_error(ex)), 500
+
+    data = [
+        {
+            "name": vista.nombre, "has_empresa": vista.tiene_empresa,
+            # Solo las vistas con clave única admiten ?limit= y cursor
+            "key": list(vista.clave) if vista.clave else None,
+            "columns": metadatos_columnas(vista.columnas),
+        }
+        for vista in catalogo.vistas()
+    ]
+    return jsonify({"status": "success", "data": data, "catalog": catalogo.stats()})
+
+# --- RUTAS DE ADMINISTRACIÓN DE LA CACHÉ ---
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats_api():
+    """Endpoint: Devuelve las estadísticas de la caché de reportes."""
+    return jsonify({"status": "success", "data": report_cache.stats()})
+
+
+@app.route('/api/cache/invalidar', methods=['POST'])
+def invalidar_cache_api():
+    """
+    Endpoint: Invalida la caché de reportes (p.ej. al mayorizar/contabilizar).
+    Cuerpo JSON opcional: {"vista": "view_...", "empresa_id": 1}. Sin filtros vacía toda la caché.
+    Requiere la cabecera 'X-Admin-Token' (CACHE_ADMIN_TOKEN); sin token configurado está deshabilitado.
+    """
+    # Denegado por defecto: con CORS abierto cualquier origen podría vaciar la caché y
+    # provocar una avalancha de consultas contra la base de datos
+    if not CACHE_ADMIN_TOKEN:
+        return jsonify({"status": "error", "message": "Invalidación deshabilitada: configure CACHE_ADMIN_TOKEN."}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), CACHE_ADMIN_TOKEN.encode()):
+        return jsonify({"status": "error", "message": "No autorizado."}), 403
+
+    cuerpo = request.get_json(silent=True) or {}
+    vista = cuerpo.get('vista')
+    empresa_id = cuerpo.get('empresa_id')
+    if empresa_id is not None:
+        try:
+            empresa_id = int(empresa_id)
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "empresa_id debe ser un entero."}), 400
+
+    if vista:
+        # Las claves de la caché usan el nombre del catálogo
+        try:
+            vista = catalogo.obtener(vista).nombre
+        except (VistaNoEncontrada, PoolAgotadoError, ErrorBD):
+            pass
+
+    eliminadas = report_cache.invalidate(view_name=vista, empresa_id=empresa_id)
+    return jsonify({"status": "success", "data": {"eliminadas": eliminadas}})
+
+# --- MÉTRICAS DE RENDIMIENTO ---
+
+@app.before_request
+def _iniciar_medicion():
+    medicion, token = metricas.iniciar(request.endpoint or 'desconocido')
+    if medicion is not None:
+        g.medicion = medicion
+        g.medicion_token = token
+
+
+@app.after_request
+def _registrar_medicion(respuesta):
+    medicion = g.pop('medicion', None)
+    if medicion is None:
+        return respuesta
+    respuesta.headers['Server-Timing'] = medicion.server_timing()
+    if respuesta.is_streamed:
+        # En las respuestas transmitidas la duración, las filas y los bytes se registran al terminar el envío
+        respuesta.response = metricas.contar_bytes(respuesta.response, medicion)
+    else:
+        medicion.bytes = respuesta.content_length or 0
+    estado = respuesta.status_code
+    respuesta.call_on_close(lambda: metricas.finalizar(medicion, estado))
+    return respuesta
+
+
+@app.teardown_request
+def _soltar_medicion(ex=None):
+    # Si la vista lanzó una excepción no se pasó por after_request
+    medicion = g.pop('medicion', None)
+    if medicion is not None:
+        metricas.finalizar(medicion, 500)
+    metricas.soltar(g.pop('medicion_token', None))
+
+
+@app.route('/metrics', methods=['GET'])
+def metricas_api():
+    """Endpoint: Métricas en formato de texto de Prometheus (endpoints, fases, pool, caché y catálogo)."""
+    lineas = metricas.prometheus()
+    lineas += estadisticas_prometheus(
+        'reportes_pool', 'Pool de conexiones', pool.stats(), contadores=ConnectionPool.CONTADORES,
+    )
+    lineas += estadisticas_prometheus(
+        'reportes_cache', 'Caché de reportes', report_cache.stats(), contadores=ReportCache.CONTADORES,
+    )
+    lineas += estadisticas_prometheus('reportes_catalogo', 'Catálogo de vistas', catalogo.stats())
+    return app.response_class('\n'.join(lineas) + '\n', mimetype='text/plain; version=0.0.4')
+
+# --- RUTA DE DIAGNÓSTICO DEL POOL DE CONEXIONES ---
+
+@app.route('/api/pool', methods=['GET'])
+def pool_stats_api():
+    """Endpoint: Devuelve las estadísticas del pool de conexiones a la base de datos."""
+    return jsonify({"status": "success", "data": pool.stats()})
 
 if __name__ == '__main__':
     # Ejecuta la aplicación Flask en el puerto 8000
@@ -0,0 +1,143 @@
+"""
+Backends de base de datos.
+
+Encapsulan lo que cambia entre motores: cómo se abre una conexión, la clase de error
+del driver, el dialecto SQL (ver consultas.construir_consulta), la lectura del
+catálogo de vistas, el timeout por consulta y el reconocimiento de algunos errores.
+
+- ``sqlserver``: Azure SQL / SQL Server mediante pyodbc (el valor por defecto).
+- ``sqlite``: base local de prueba creada con ``base_local.py``, para desarrollo y
+  benchmarks sin acceso a Azure. No requiere pyodbc.
+"""
+import math
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from catalogo import CONSULTA_CATALOGO
+
+
+class BackendSQLServer:
+    """Azure SQL / SQL Server con pyodbc (se importa al crear el backend)."""
+
+    nombre = 'sqlserver'
+    dialecto = 'sqlserver'
+
+    def __init__(self, connection_string):
+        import pyodbc  # Solo se requiere con este backend
+
+        self._pyodbc = pyodbc
+        self.connection_string = connection_string
+        self.Error = pyodbc.Error
+
+    def conectar(self):
+        return self._pyodbc.connect(self.connection_string)
+
+    def leer_catalogo(self, conn):
+        """Filas ``(vista, columna, data_type, escala)`` de INFORMATION_SCHEMA (ver catalogo.CONSULTA_CATALOGO)."""
+        cursor = conn.cursor()
+        cursor.execute(CONSULTA_CATALOGO)
+        filas = [tuple(row) for row in cursor.fetchall()]
+        cursor.close()
+        return filas
+
+    def aplicar_timeout(self, conn, segundos):
+        """Timeout de consulta del driver (pyodbc: SQL_ATTR_QUERY_TIMEOUT); 0 o None lo desactiva."""
+        conn.timeout = int(math.ceil(segundos)) if segundos else 0
+
+    def objeto_inexistente(self, mensaje):
+        return 'Invalid object name' in mensaje
+
+    def error_de_conexion(self, mensaje):
+        return 'Login failed' in mensaje or 'ODBC Driver' in mensaje or 'firewall' in mensaje
+
+
+# --- SQLite ---
+
+# Tipo declarado en la base local: nombre y escala opcional, p.ej. DECIMAL(18, 2)
+_TIPO_DECLARADO = re.compile(r'^\s*([A-Za-z]+)\s*(?:\(\s*\d+\s*(?:,\s*(\d+)\s*)?\))?')
+# Nombres propios de SQLite -> DATA_TYPE equivalente de SQL Server (los demás coinciden)
+_TIPOS_SQLITE = {'integer': 'int', 'text': 'nvarchar', 'blob': 'varbinary'}
+
+
+def _convertir_decimal(valor):
+    return Decimal(valor.decode('ascii'))
+
+
+def _registrar_tipos():
+    # Los decimales y fechas se devuelven con los mismos tipos de Python que pyodbc.
+    # Solo aplica a columnas con tipo declarado (no a expresiones como SUM(...)).
+    sqlite3.register_adapter(Decimal, str)
+    sqlite3.register_adapter(date, date.isoformat)
+    sqlite3.register_adapter(datetime, lambda valor: valor.isoformat(' '))
+    sqlite3.register_converter('DECIMAL', _convertir_decimal)
+    sqlite3.register_converter('NUMERIC', _convertir_decimal)
+    sqlite3.register_converter('DATE', lambda valor: date.fromisoformat(valor.decode('ascii')))
+    sqlite3.register_converter('DATETIME', lambda valor: datetime.fromisoformat(valor.decode('ascii')))
+
+
+class BackendSQLite:
+    """
+    Base SQLite local que imita el esquema ``dbo`` de producción: el archivo se adjunta
+    con el nombre ``dbo`` para que las mismas consultas (``dbo.Principal``, ``dbo.[vista]``)
+    funcionen sin cambios, salvo la paginación (``LIMIT`` en lugar de ``TOP``).
+    """
+
+    nombre = 'sqlite'
+    dialecto = 'sqlite'
+    Error = sqlite3.Error
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        _registrar_tipos()
+
+    def conectar(self):
+        # El pool entrega la conexión a un hilo por vez
+        conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("ATTACH DATABASE ? AS dbo", (self.ruta,))
+        return conn
+
+    def leer_catalogo(self, conn):
+        """Filas ``(vista, columna, data_type, escala)`` a partir de los tipos declarados (vacío en expresiones)."""
+        cursor = conn.execute(
+            "SELECT m.name, p.name, p.type FROM dbo.sqlite_master m, pragma_table_info(m.name, 'dbo') p "
+            "WHERE m.type = 'view' ORDER BY m.name, p.cid"
+        )
+        filas = []
+        for vista, columna, declarado in cursor.fetchall():
+            coincidencia = _TIPO_DECLARADO.match(declarado or '')
+            data_type = coincidencia.group(1).lower() if coincidencia else ''
+            data_type = _TIPOS_SQLITE.get(data_type, data_type)
+            escala = coincidencia.group(2) if coincidencia else None
+            filas.append((vista, columna, data_type, int(escala) if escala is not None else None))
+        cursor.close()
+        return filas
+
+    def aplicar_timeout(self, conn, segundos):
+        """SQLite no tiene timeout por consulta: se interrumpe desde el progress handler al vencer el plazo."""
+        if not segundos:
+            conn.set_progress_handler(None, 0)
+            return
+        limite = time.monotonic() + segundos
+        conn.set_progress_handler(lambda: time.monotonic() > limite, 10000)
+
+    def objeto_inexistente(self, mensaje):
+        return 'no such table' in mensaje
+
+    def error_de_conexion(self, mensaje):
+        return 'unable to open database' in mensaje
+
+
+BACKENDS = {
+    BackendSQLServer.nombre: BackendSQLServer,
+    BackendSQLite.nombre: BackendSQLite,
+}
+
+
+def crear_backend(nombre, **config):
+    """Instancia el backend ``nombre`` ('sqlserver' o 'sqlite') con su configuración."""
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de base de datos desconocido: '{nombre}'. Opciones: {', '.join(BACKENDS)}.")
+    return BACKENDS[nombre](**config)
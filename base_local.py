@@ -0,0 +1,173 @@
+"""
+Base SQLite local con datos contables sintéticos (sustituto de Azure SQL).
+
+Crea ``Principal`` (empresas), el plan de cuentas, los movimientos y las cuatro
+vistas de reportes con los mismos nombres que en producción. El volumen se
+controla con empresas x cuentas x movimientos por cuenta.
+
+Uso:
+    python base_local.py reportes.sqlite --empresas 5 --cuentas 60 --movimientos 500
+    DB_BACKEND=sqlite DB_SQLITE_PATH=reportes.sqlite python app.py
+
+Los importes son DECIMAL(18,2): las columnas directas de las vistas se leen como
+``Decimal`` (igual que con pyodbc); las agregadas (SUM) llegan como float porque
+SQLite no conserva el tipo declarado de las expresiones.
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+from decimal import Decimal
+
+# (código, nombre, tipo): el primer dígito del código indica el grupo, como en un plan de cuentas usual
+GRUPOS_CUENTAS = (
+    ('1', 'Activo', 'Activo'),
+    ('2', 'Pasivo', 'Pasivo'),
+    ('3', 'Patrimonio', 'Patrimonio'),
+    ('4', 'Ingresos', 'Ingreso'),
+    ('5', 'Gastos', 'Gasto'),
+)
+
+CONCEPTOS = (
+    'Venta de mercadería', 'Compra de insumos', 'Pago a proveedores', 'Cobro a clientes',
+    'Pago de sueldos', 'Depósito bancario', 'Gastos bancarios', 'Ajuste de inventario',
+)
+
+ESQUEMA = """
+CREATE TABLE Principal (
+    REG_Empresa INTEGER PRIMARY KEY,
+    Nombre_empresa TEXT NOT NULL
+);
+
+CREATE TABLE Cuentas (
+    Empresa INTEGER NOT NULL REFERENCES Principal (REG_Empresa),
+    Cuenta TEXT NOT NULL,
+    Nombre_Cuenta TEXT NOT NULL,
+    Tipo TEXT NOT NULL,
+    PRIMARY KEY (Empresa, Cuenta)
+);
+
+CREATE TABLE Movimientos (
+    Id INTEGER PRIMARY KEY,
+    Empresa INTEGER NOT NULL,
+    Cuenta TEXT NOT NULL,
+    Fecha DATE NOT NULL,
+    Concepto TEXT NOT NULL,
+    Debe DECIMAL(18, 2) NOT NULL,
+    Haber DECIMAL(18, 2) NOT NULL
+);
+
+CREATE INDEX IX_Movimientos_Empresa ON Movimientos (Empresa, Cuenta, Fecha);
+
+CREATE VIEW view_Movimientos_Cuentas AS
+SELECT m.Id, m.Empresa, m.Cuenta, c.Nombre_Cuenta, m.Fecha, m.Concepto, m.Debe, m.Haber
+FROM Movimientos m
+JOIN Cuentas c ON c.Empresa = m.Empresa AND c.Cuenta = m.Cuenta;
+
+CREATE VIEW view_Balance_Comprobacion AS
+SELECT m.Empresa, m.Cuenta, c.Nombre_Cuenta,
+       ROUND(SUM(m.Debe), 2) AS Debe, ROUND(SUM(m.Haber), 2) AS Haber,
+       ROUND(SUM(m.Debe - m.Haber), 2) AS Saldo
+FROM Movimientos m
+JOIN Cuentas c ON c.Empresa = m.Empresa AND c.Cuenta = m.Cuenta
+GROUP BY m.Empresa, m.Cuenta, c.Nombre_Cuenta;
+
+CREATE VIEW view_Estado_Resultados AS
+SELECT m.Empresa, c.Tipo, m.Cuenta, c.Nombre_Cuenta,
+       ROUND(SUM(CASE WHEN c.Tipo = 'Ingreso' THEN m.Haber - m.Debe ELSE m.Debe - m.Haber END), 2) AS Importe
+FROM Movimientos m
+JOIN Cuentas c ON c.Empresa = m.Empresa AND c.Cuenta = m.Cuenta
+WHERE c.Tipo IN ('Ingreso', 'Gasto')
+GROUP BY m.Empresa, c.Tipo, m.Cuenta, c.Nombre_Cuenta;
+
+CREATE VIEW view_Balance_Financiero AS
+SELECT m.Empresa, c.Tipo, m.Cuenta, c.Nombre_Cuenta,
+       ROUND(SUM(CASE WHEN c.Tipo = 'Activo' THEN m.Debe - m.Haber ELSE m.Haber - m.Debe END), 2) AS Saldo
+FROM Movimientos m
+JOIN Cuentas c ON c.Empresa = m.Empresa AND c.Cuenta = m.Cuenta
+WHERE c.Tipo IN ('Activo', 'Pasivo', 'Patrimonio')
+GROUP BY m.Empresa, c.Tipo, m.Cuenta, c.Nombre_Cuenta;
+"""
+
+
+def _importe(azar):
+    return str(Decimal(azar.randint(100, 5_000_000)).scaleb(-2))
+
+
+def _plan_de_cuentas(cuentas):
+    """(cuenta, nombre, tipo) de cada cuenta, repartidas entre los grupos."""
+    for indice in range(cuentas):
+        codigo, nombre, tipo = GRUPOS_CUENTAS[indice % len(GRUPOS_CUENTAS)]
+        yield f"{codigo}{indice:04d}", f"{nombre} {indice:04d}", tipo
+
+
+def _movimientos(empresas, cuentas, movimientos, azar, desde):
+    for empresa in range(1, empresas + 1):
+        for cuenta, _, _ in _plan_de_cuentas(cuentas):
+            for _ in range(movimientos):
+                debe, haber = (_importe(azar), '0.00') if azar.random() < 0.5 else ('0.00', _importe(azar))
+                yield (
+                    empresa, cuenta, (desde + timedelta(days=azar.randrange(365))).isoformat(),
+                    azar.choice(CONCEPTOS), debe, haber,
+                )
+
+
+def crear_base_local(ruta, empresas=3, cuentas=40, movimientos=250, semilla=42, reemplazar=False):
+    """
+    Crea la base en ``ruta`` con ``empresas`` x ``cuentas`` x ``movimientos`` filas de movimientos.
+    Devuelve la cantidad total de movimientos.
+    """
+    if os.path.exists(ruta):
+        if not reemplazar:
+            raise FileExistsError(f"La base '{ruta}' ya existe (use reemplazar=True / --reemplazar).")
+        os.remove(ruta)
+
+    azar = random.Random(semilla)
+    conn = sqlite3.connect(ruta)
+    try:
+        # Carga masiva: sin journal ni fsync (la base se puede regenerar)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(ESQUEMA)
+        conn.executemany(
+            "INSERT INTO Principal (REG_Empresa, Nombre_empresa) VALUES (?, ?)",
+            [(empresa, f"Empresa Demo {empresa}") for empresa in range(1, empresas + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO Cuentas (Empresa, Cuenta, Nombre_Cuenta, Tipo) VALUES (?, ?, ?, ?)",
+            [
+                (empresa, cuenta, nombre, tipo)
+                for empresa in range(1, empresas + 1)
+                for cuenta, nombre, tipo in _plan_de_cuentas(cuentas)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO Movimientos (Empresa, Cuenta, Fecha, Concepto, Debe, Haber) VALUES (?, ?, ?, ?, ?, ?)",
+            _movimientos(empresas, cuentas, movimientos, azar, date(2024, 1, 1)),
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return empresas * cuentas * movimientos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ruta', help='Archivo SQLite a crear')
+    parser.add_argument('--empresas', type=int, default=3)
+    parser.add_argument('--cuentas', type=int, default=40, help='Cuentas por empresa')
+    parser.add_argument('--movimientos', type=int, default=250, help='Movimientos por cuenta')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--reemplazar', action='store_true', help='Sobrescribe la base si ya existe')
+    args = parser.parse_args()
+
+    total = crear_base_local(
+        args.ruta, args.empresas, args.cuentas, args.movimientos, semilla=args.semilla, reemplazar=args.reemplazar,
+    )
+    print(f"{args.ruta}: {args.empresas} empresas, {args.empresas * args.cuentas} cuentas, {total:,} movimientos")
+
+
+if __name__ == '__main__':
+    main()
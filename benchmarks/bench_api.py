@@ -0,0 +1,319 @@
+"""
+Benchmark de carga de la API de reportes sobre la base SQLite local.
+
+Genera la base sintética (base_local.py), levanta la aplicación en un servidor
+WSGI con hilos (un proceso nuevo por escenario, para medir su pico de memoria por
+separado) y la recorre con clientes HTTP concurrentes. Por escenario informa:
+peticiones por segundo, latencia p50/p99, pico de RSS del servidor y tamaño de la
+respuesta.
+
+Los resultados se comparan con una línea base guardada (``--guardar`` la
+actualiza); una diferencia mayor que ``--tolerancia`` se marca como regresión y el
+proceso termina con código 1. Las líneas base dependen de la máquina: conviene
+regenerarlas en la misma máquina en la que se compara.
+
+La caché de reportes se deshabilita por defecto para medir el camino a la base de
+datos (``--cache`` la activa).
+
+Uso:
+    python benchmarks/bench_api.py
+    python benchmarks/bench_api.py --guardar
+    python benchmarks/bench_api.py --empresas 5 --cuentas 100 --movimientos 1000 --concurrencia 16
+    python benchmarks/bench_api.py --escenario movimientos_rows --escenario lote
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, RAIZ)
+
+from base_local import crear_base_local  # noqa: E402
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_api.json')
+
+VISTAS = ('view_Balance_Comprobacion', 'view_Estado_Resultados', 'view_Balance_Financiero', 'view_Movimientos_Cuentas')
+
+# nombre -> (método, ruta, cuerpo JSON); {empresa} se reemplaza rotando entre las empresas de la base
+ESCENARIOS = {
+    'empresas': ('GET', '/api/empresas', None),
+    'balance_comprobacion': ('GET', '/api/reporte-vista/view_Balance_Comprobacion?empresa_id={empresa}', None),
+    'movimientos_rows': ('GET', '/api/reporte-vista/view_Movimientos_Cuentas?empresa_id={empresa}', None),
+    'movimientos_columnar': (
+        'GET', '/api/reporte-vista/view_Movimientos_Cuentas?empresa_id={empresa}&layout=columnar', None,
+    ),
+    'movimientos_pagina': (
+        'GET', '/api/reporte-vista/view_Movimientos_Cuentas?empresa_id={empresa}&layout=columnar&limit=500&total=1',
+        None,
+    ),
+    'movimientos_ndjson': ('GET', '/api/reporte-vista/view_Movimientos_Cuentas?empresa_id={empresa}&format=ndjson', None),
+    'export_csv': ('GET', '/api/reporte-vista/view_Movimientos_Cuentas/export?empresa_id={empresa}&format=csv', None),
+    # Como la precarga de la interfaz: los estados sin clave única se piden completos (no se paginan)
+    'lote': ('POST', '/api/reportes', {
+        "vistas": [vista for vista in VISTAS if vista != 'view_Movimientos_Cuentas'],
+        "empresa_ids": ['{empresa}'], "layout": "columnar",
+    }),
+}
+
+# Métrica -> True si un valor mayor es peor
+METRICAS = {'rps': False, 'p50_ms': True, 'p99_ms': True, 'rss_mb': True, 'bytes': True}
+
+
+# --- Servidor ---
+
+def servir(puerto):
+    """Modo servidor (subproceso): la configuración llega por variables de entorno."""
+    from werkzeug.serving import make_server
+
+    import app as aplicacion
+
+    make_server('127.0.0.1', puerto, aplicacion.app, threaded=True).serve_forever()
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def pico_rss_mb(pid):
+    """Pico de memoria residente del proceso (VmHWM de /proc, solo Linux)."""
+    try:
+        with open(f'/proc/{pid}/status') as estado:
+            for linea in estado:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Servidor:
+    def __init__(self, base, concurrencia, cache):
+        self.puerto = _puerto_libre()
+        entorno = dict(
+            os.environ,
+            DB_BACKEND='sqlite',
+            DB_SQLITE_PATH=base,
+            DB_POOL_MAX_SIZE=str(concurrencia),
+            BATCH_MAX_WORKERS=str(min(4, concurrencia)),
+            VIEW_CATALOG_REFRESH='0',
+            REPORT_CACHE_TTL=os.environ.get('REPORT_CACHE_TTL', '300') if cache else '0',
+        )
+        self.proceso = subprocess.Popen(
+            [sys.executable, __file__, '--servidor', str(self.puerto)],
+            env=entorno, cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._esperar()
+
+    def _esperar(self, timeout=30):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if self.proceso.poll() is not None:
+                raise RuntimeError("El servidor terminó al iniciar.")
+            try:
+                if peticion(self.puerto, 'GET', '/api/views')[0] == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("El servidor no respondió a tiempo.")
+
+    def detener(self):
+        rss = pico_rss_mb(self.proceso.pid)
+        self.proceso.terminate()
+        self.proceso.wait()
+        return rss
+
+
+# --- Cliente ---
+
+def peticion(puerto, metodo, ruta, cuerpo=None):
+    """Hace una petición completa y devuelve ``(estado, bytes del cuerpo)``."""
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=120)
+    try:
+        datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+        cabeceras = {'Content-Type': 'application/json'} if datos else {}
+        conexion.request(metodo, ruta, body=datos, headers=cabeceras)
+        respuesta = conexion.getresponse()
+        total = 0
+        while True:
+            fragmento = respuesta.read(65536)
+            if not fragmento:
+                break
+            total += len(fragmento)
+        return respuesta.status, total
+    finally:
+        conexion.close()
+
+
+def _instanciar(plantilla, empresa):
+    if isinstance(plantilla, str):
+        return int(plantilla.format(empresa=empresa)) if plantilla == '{empresa}' else plantilla.format(empresa=empresa)
+    if isinstance(plantilla, list):
+        return [_instanciar(item, empresa) for item in plantilla]
+    if isinstance(plantilla, dict):
+        return {clave: _instanciar(valor, empresa) for clave, valor in plantilla.items()}
+    return plantilla
+
+
+def percentil(valores, q):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def medir_escenario(nombre, args, base):
+    metodo, ruta, cuerpo = ESCENARIOS[nombre]
+    servidor = Servidor(base, args.concurrencia, args.cache)
+    try:
+        contador = iter(range(args.peticiones + args.calentamiento))
+        lock = threading.Lock()
+
+        def siguiente():
+            with lock:
+                i = next(contador)
+            empresa = i % args.empresas + 1
+            return _instanciar(ruta, empresa), _instanciar(cuerpo, empresa)
+
+        for _ in range(args.calentamiento):
+            ruta_i, cuerpo_i = siguiente()
+            peticion(servidor.puerto, metodo, ruta_i, cuerpo_i)
+
+        def ejecutar(_):
+            ruta_i, cuerpo_i = siguiente()
+            inicio = time.perf_counter()
+            estado, tamano = peticion(servidor.puerto, metodo, ruta_i, cuerpo_i)
+            return time.perf_counter() - inicio, estado, tamano
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrencia) as clientes:
+            resultados = list(clientes.map(ejecutar, range(args.peticiones)))
+        duracion = time.perf_counter() - inicio
+    finally:
+        rss = servidor.detener()
+
+    latencias = [latencia for latencia, _, _ in resultados]
+    errores = sum(1 for _, estado, _ in resultados if estado != 200)
+    return {
+        "rps": args.peticiones / duracion,
+        "p50_ms": percentil(latencias, 0.50) * 1000,
+        "p99_ms": percentil(latencias, 0.99) * 1000,
+        "rss_mb": rss,
+        "bytes": sum(tamano for _, _, tamano in resultados) / len(resultados),
+        "errores": errores,
+    }
+
+
+# --- Línea base ---
+
+def comparar(actual, base, tolerancia):
+    """Devuelve ``{escenario: {metrica: (cambio relativo, es_regresion)}}`` para los escenarios en común."""
+    comparacion = {}
+    for nombre, metricas in actual.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        comparacion[nombre] = {}
+        for metrica, mayor_es_peor in METRICAS.items():
+            previo, valor = anterior.get(metrica), metricas.get(metrica)
+            if not previo or valor is None:
+                continue
+            cambio = valor / previo - 1
+            peor = cambio if mayor_es_peor else -cambio
+            comparacion[nombre][metrica] = (cambio, peor > tolerancia)
+    return comparacion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servidor', type=int, metavar='PUERTO', help=argparse.SUPPRESS)
+    parser.add_argument('--empresas', type=int, default=3)
+    parser.add_argument('--cuentas', type=int, default=40, help='Cuentas por empresa')
+    parser.add_argument('--movimientos', type=int, default=250, help='Movimientos por cuenta')
+    parser.add_argument('--base', help='Archivo SQLite a usar (se crea si no existe); por defecto uno temporal')
+    parser.add_argument('--concurrencia', type=int, default=8, help='Clientes simultáneos')
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones medidas por escenario')
+    parser.add_argument('--calentamiento', type=int, default=5)
+    parser.add_argument('--escenario', action='append', choices=sorted(ESCENARIOS), help='Repetible; por defecto todos')
+    parser.add_argument('--cache', action='store_true', help='Mide con la caché de reportes activa')
+    parser.add_argument('--linea-base', default=LINEA_BASE)
+    parser.add_argument('--guardar', action='store_true', help='Guarda los resultados como nueva línea base')
+    parser.add_argument('--tolerancia', type=float, default=0.25, help='Cambio relativo tolerado antes de marcar regresión')
+    args = parser.parse_args()
+
+    if args.servidor:
+        servir(args.servidor)
+        return
+
+    escala = {"empresas": args.empresas, "cuentas": args.cuentas, "movimientos": args.movimientos}
+    with tempfile.TemporaryDirectory() as directorio:
+        base = args.base or os.path.join(directorio, 'reportes.sqlite')
+        if not os.path.exists(base):
+            total = crear_base_local(base, **escala)
+            print(f"Base sintética: {total:,} movimientos ({args.empresas} empresas x {args.cuentas} cuentas x {args.movimientos})")
+
+        resultados = {}
+        print(f"{args.peticiones} peticiones por escenario, {args.concurrencia} clientes, caché {'activa' if args.cache else 'deshabilitada'}")
+        print(f"{'escenario':<24}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'RSS MB':>9}{'KB/resp':>10}{'errores':>9}")
+        for nombre in args.escenario or ESCENARIOS:
+            m = resultados[nombre] = medir_escenario(nombre, args, base)
+            rss = f"{m['rss_mb']:>9.1f}" if m['rss_mb'] is not None else f"{'-':>9}"
+            print(
+                f"{nombre:<24}{m['rps']:>9.1f}{m['p50_ms']:>10.1f}{m['p99_ms']:>10.1f}{rss}"
+                f"{m['bytes'] / 1024:>10.1f}{m['errores']:>9}"
+            )
+
+    documento = {
+        "meta": {
+            **escala, "concurrencia": args.concurrencia, "peticiones": args.peticiones, "cache": args.cache,
+            "python": platform.python_version(), "maquina": platform.machine(), "fecha": time.strftime('%Y-%m-%d'),
+        },
+        "escenarios": {
+            nombre: {metrica: round(valor, 2) if isinstance(valor, float) else valor for metrica, valor in m.items()}
+            for nombre, m in resultados.items()
+        },
+    }
+
+    regresiones = False
+    if os.path.exists(args.linea_base) and not args.guardar:
+        with open(args.linea_base, encoding='utf-8') as archivo:
+            base_guardada = json.load(archivo)
+        distintas = {
+            clave for clave in ('empresas', 'cuentas', 'movimientos', 'concurrencia', 'cache')
+            if base_guardada['meta'].get(clave) != documento['meta'][clave]
+        }
+        if distintas:
+            print(f"\nAviso: la línea base usa otra configuración ({', '.join(sorted(distintas))}); la comparación es orientativa.")
+        print(f"\nComparación con {os.path.relpath(args.linea_base)} ({base_guardada['meta'].get('fecha')}):")
+        for nombre, cambios in comparar(resultados, base_guardada['escenarios'], args.tolerancia).items():
+            detalle = '  '.join(
+                f"{metrica} {cambio:+.0%}{' REGRESIÓN' if regresion else ''}"
+                for metrica, (cambio, regresion) in cambios.items()
+            )
+            print(f"{nombre:<24}{detalle}")
+            regresiones = regresiones or any(regresion for _, regresion in cambios.values())
+
+    if args.guardar:
+        with open(args.linea_base, 'w', encoding='utf-8') as archivo:
+            json.dump(documento, archivo, indent=2, sort_keys=True)
+            archivo.write('\n')
+        print(f"\nLínea base guardada en {os.path.relpath(args.linea_base)}")
+
+    if any(m['errores'] for m in resultados.values()):
+        print("\nHubo respuestas con error (ver columna 'errores').")
+        sys.exit(1)
+    if regresiones:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
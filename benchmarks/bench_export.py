@@ -0,0 +1,86 @@
+"""
+Benchmark de la exportación en el servidor (CSV, XLSX y PDF) sobre una vista de 1M de filas.
+
+Las filas se generan por lotes, igual que las entrega iterar_select_query con fetchmany,
+y el archivo resultante solo se cuenta (no se guarda). Cada formato se mide en un
+subproceso propio para que el pico de memoria (RSS) no se contamine entre formatos.
+
+Uso:
+    python benchmarks/bench_export.py --filas 1000000
+    python benchmarks/bench_export.py --formato csv --filas 200000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_formatos import COLUMNAS, generar_filas  # noqa: E402
+from exportacion import EXPORTADORES  # noqa: E402
+
+TAMANO_LOTE = 1000
+
+
+def lotes_sinteticos(cantidad):
+    """Lotes de filas como los de fetchmany, sin materializar la vista completa."""
+    plantilla = generar_filas(TAMANO_LOTE)
+    for inicio in range(0, cantidad, TAMANO_LOTE):
+        yield plantilla[:min(TAMANO_LOTE, cantidad - inicio)]
+
+
+def pico_rss_mb():
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def medir_formato(formato, filas):
+    exportador = EXPORTADORES[formato][0]
+    rss_inicial = pico_rss_mb()
+    inicio = time.perf_counter()
+    primer_byte = None
+    total = 0
+    for fragmento in exportador(COLUMNAS, lotes_sinteticos(filas), titulo='Movimientos Cuentas'):
+        if primer_byte is None:
+            primer_byte = time.perf_counter() - inicio
+        total += len(fragmento)
+    return {
+        "formato": formato,
+        "filas": filas,
+        "segundos": time.perf_counter() - inicio,
+        "primer_byte_s": primer_byte,
+        "bytes": total,
+        "rss_inicial_mb": rss_inicial,
+        "rss_pico_mb": pico_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--formato', choices=sorted(EXPORTADORES), help='Mide un solo formato en este proceso')
+    args = parser.parse_args()
+
+    if args.formato:
+        print(json.dumps(medir_formato(args.formato, args.filas)))
+        return
+
+    print(f"{args.filas:,} filas")
+    print(f"{'formato':<8}{'segundos':>10}{'1er byte':>10}{'filas/s':>12}{'MB':>10}{'RSS pico MB':>13}")
+    for formato in EXPORTADORES:
+        salida = subprocess.run(
+            [sys.executable, __file__, '--formato', formato, '--filas', str(args.filas)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        m = json.loads(salida)
+        print(
+            f"{formato:<8}{m['segundos']:>10.1f}{m['primer_byte_s']:>10.2f}{m['filas'] / m['segundos']:>12,.0f}"
+            f"{m['bytes'] / 1e6:>10.1f}{m['rss_pico_mb']:>13.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark de formatos de respuesta: tamaño del payload y CPU de serialización.
+
+Compara el formato actual (un diccionario de strings por fila) con el formato
+columnar en JSON y, si están instaladas, MessagePack y Arrow IPC, usando filas
+sintéticas con la forma de view_Movimientos_Cuentas.
+
+Uso:
+    python benchmarks/bench_formatos.py --filas 100000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from consultas import Columna  # noqa: E402
+import formatos  # noqa: E402
+
+COLUMNAS = [
+    Columna('Empresa', 'int', None),
+    Columna('Cuenta', 'str', None),
+    Columna('Nombre_Cuenta', 'str', None),
+    Columna('Fecha', 'date', None),
+    Columna('Concepto', 'str', None),
+    Columna('Debe', 'decimal', 2),
+    Columna('Haber', 'decimal', 2),
+    Columna('Saldo', 'decimal', 2),
+]
+
+
+def generar_filas(cantidad, semilla=42):
+    azar = random.Random(semilla)
+    inicio = date(2024, 1, 1)
+    filas = []
+    saldo = Decimal('0.00')
+    for i in range(cantidad):
+        debe = Decimal(azar.randint(0, 5_000_000)).scaleb(-2)
+        haber = Decimal(azar.randint(0, 5_000_000)).scaleb(-2)
+        saldo += debe - haber
+        cuenta = f"1{azar.randint(100, 999)}"
+        filas.append((
+            1, cuenta, f"Cuenta {cuenta}", inicio + timedelta(days=i % 365),
+            f"Asiento {i}", debe, haber, saldo,
+        ))
+    return filas
+
+
+def serializar_actual(filas):
+    # Réplica del formato por defecto de app.py: str(valor) por celda y claves ordenadas (jsonify)
+    nombres = [columna.nombre for columna in COLUMNAS]
+    data = [dict(zip(nombres, [str(v) if v is not None else v for v in fila])) for fila in filas]
+    documento = {"status": "success", "query": "SELECT ...", "data": data}
+    return json.dumps(documento, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def medir(nombre, funcion, repeticiones):
+    mejor = float('inf')
+    cuerpo = b''
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cuerpo = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return {
+        "formato": nombre,
+        "bytes": len(cuerpo),
+        "gzip": len(gzip.compress(cuerpo, compresslevel=6)),
+        "ms": mejor * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=100_000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    filas = generar_filas(args.filas)
+    resultado = {"status": "success", "query": "SELECT ...", "columnas": COLUMNAS, "filas": filas}
+
+    candidatos = [
+        ("filas (actual)", lambda: serializar_actual(filas)),
+        ("columnar JSON", lambda: formatos.serializar_columnar(resultado, formatos.MIMETYPE_JSON)),
+    ]
+    if formatos.msgpack is not None:
+        candidatos.append(("columnar MessagePack", lambda: formatos.serializar_columnar(resultado, formatos.MIMETYPE_MSGPACK)))
+    if formatos.pyarrow is not None:
+        candidatos.append(("Arrow IPC", lambda: formatos.serializar_columnar(resultado, formatos.MIMETYPE_ARROW)))
+
+    mediciones = [medir(nombre, funcion, args.repeticiones) for nombre, funcion in candidatos]
+    base = mediciones[0]
+
+    print(f"{args.filas} filas, mejor de {args.repeticiones} repeticiones")
+    print(f"{'formato':<22}{'bytes':>14}{'gzip':>12}{'ms':>10}{'tamaño':>9}{'cpu':>7}")
+    for m in mediciones:
+        print(
+            f"{m['formato']:<22}{m['bytes']:>14,}{m['gzip']:>12,}{m['ms']:>10.1f}"
+            f"{m['bytes'] / base['bytes']:>9.2f}{m['ms'] / base['ms']:>7.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Catálogo de las vistas de reportes.
+
+Se carga al iniciar la aplicación (INFORMATION_SCHEMA.VIEWS / COLUMNS) y se refresca
+en segundo plano. Guarda las columnas tipadas de cada vista, si tiene la columna
+``Empresa`` y el SELECT con la lista explícita de columnas ya armado, de modo que
+una vista desconocida se rechaza sin consultar la base de datos.
+
+Los nombres de vistas y columnas se comparan sin distinguir mayúsculas, como la
+intercalación por defecto de Azure SQL; se conserva el nombre de INFORMATION_SCHEMA.
+
+Opcionalmente se restringe a una lista de vistas permitidas y se declara la clave
+única de las vistas que admiten paginación (configuración): INFORMATION_SCHEMA no
+informa qué columnas de una vista identifican a cada fila.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from consultas import COLUMNA_EMPRESA, IDENTIFICADOR, Columna, citar
+
+logger = logging.getLogger(__name__)
+
+# Columnas de todas las vistas del esquema dbo, en el orden en que las devuelve SELECT *
+CONSULTA_CATALOGO = (
+    "SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.NUMERIC_SCALE "
+    "FROM INFORMATION_SCHEMA.COLUMNS c "
+    "JOIN INFORMATION_SCHEMA.VIEWS v ON v.TABLE_SCHEMA = c.TABLE_SCHEMA AND v.TABLE_NAME = c.TABLE_NAME "
+    "WHERE c.TABLE_SCHEMA = 'dbo' "
+    "ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION"
+)
+
+# DATA_TYPE de SQL Server -> tipo normalizado de Columna (el resto se trata como 'str')
+_TIPOS_SQL = {
+    'bigint': 'int', 'int': 'int', 'smallint': 'int', 'tinyint': 'int',
+    'decimal': 'decimal', 'numeric': 'decimal', 'money': 'decimal', 'smallmoney': 'decimal',
+    'float': 'float', 'real': 'float',
+    'date': 'date',
+    'datetime': 'datetime', 'datetime2': 'datetime', 'smalldatetime': 'datetime', 'datetimeoffset': 'datetime',
+    'time': 'time',
+    'bit': 'bool',
+    'binary': 'bytes', 'varbinary': 'bytes', 'image': 'bytes', 'timestamp': 'bytes', 'rowversion': 'bytes',
+}
+
+# nombre: nombre de la vista; columnas: lista de Columna; tiene_empresa: si se puede filtrar por
+# empresa; sql: SELECT con columnas explícitas filtrado por empresa (None si no tiene esa columna);
+# clave: nombres de las columnas que identifican a una fila dentro de la empresa (None: no se pagina)
+Vista = namedtuple('Vista', 'nombre columnas tiene_empresa sql clave')
+
+
+class VistaNoEncontrada(LookupError):
+    """La vista no existe o no está permitida."""
+
+
+def columna_desde_catalogo(data_type, escala):
+    """Convierte el DATA_TYPE / NUMERIC_SCALE de INFORMATION_SCHEMA.COLUMNS en ``(tipo, escala)`` de Columna."""
+    tipo = _TIPOS_SQL.get((data_type or '').lower(), 'str')
+    return tipo, (int(escala) if tipo == 'decimal' and escala is not None else None)
+
+
+def construir_vista(nombre, columnas, clave=None):
+    """
+    Arma la ``Vista`` con su SELECT precompilado (columnas explícitas, entre corchetes).
+    Si alguna columna de ``clave`` no existe en la vista, la vista queda sin clave (no se pagina).
+    """
+    por_nombre = {columna.nombre.casefold(): columna.nombre for columna in columnas}
+    empresa = por_nombre.get(COLUMNA_EMPRESA.casefold())
+    sql = None
+    if empresa is not None:
+        lista_columnas = ', '.join(citar(columna.nombre) for columna in columnas)
+        sql = f"SELECT {lista_columnas} FROM dbo.{citar(nombre)} WHERE {citar(empresa)} = ?"
+    if clave:
+        faltantes = [columna for columna in clave if columna.casefold() not in por_nombre]
+        if faltantes:
+            logger.warning(f"La clave de la vista '{nombre}' usa columnas inexistentes {faltantes}; no se paginará.")
+            clave = None
+        else:
+            clave = tuple(por_nombre[columna.casefold()] for columna in clave)
+    return Vista(nombre, columnas, empresa is not None, sql, clave or None)
+
+
+def leer_claves(texto):
+    """
+    Interpreta la configuración de claves únicas: ``vista:Columna`` o ``vista:Col1+Col2``,
+    separadas por coma. Devuelve ``{vista: (columnas...)}``.
+    """
+    claves = {}
+    for item in (texto or '').split(','):
+        if not item.strip():
+            continue
+        vista, separador, columnas = item.partition(':')
+        columnas = tuple(columna.strip() for columna in columnas.split('+') if columna.strip())
+        if not separador or not vista.strip() or not columnas:
+            raise ValueError(f"Clave de vista mal formada: '{item.strip()}' (se espera vista:Columna[+Columna]).")
+        claves[vista.strip()] = columnas
+    return claves
+
+
+class CatalogoVistas:
+    """
+    Catálogo en memoria de las vistas disponibles, seguro para usar desde varios hilos.
+
+    ``cargar`` es una función sin argumentos que devuelve las filas
+    ``(vista, columna, data_type, escala)`` ordenadas por vista y posición (ver CONSULTA_CATALOGO).
+    ``permitidas`` restringe el catálogo a esos nombres; ``claves`` declara la clave única de las
+    vistas paginables (``{vista: (columnas...)}``); ``al_cambiar`` recibe los nombres de las
+    vistas que cambiaron (o desaparecieron) en cada refresco.
+    """
+
+    def __init__(self, cargar, permitidas=None, claves=None, al_cambiar=None, clock=time.time):
+        self._cargar = cargar
+        self._permitidas_config = sorted(permitidas) if permitidas else None
+        self._permitidas = frozenset(nombre.casefold() for nombre in permitidas) if permitidas else None
+        self._claves = {nombre.casefold(): columnas for nombre, columnas in (claves or {}).items()}
+        self._al_cambiar = al_cambiar
+        self._clock = clock
+        # Nombre en minúsculas (casefold) -> Vista con el nombre de INFORMATION_SCHEMA
+        self._vistas = {}
+        self._cargado = False
+        self._lock_carga = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self.actualizado_en = None
+        self.ultimo_error = None
+
+    @property
+    def cargado(self):
+        return self._cargado
+
+    def refrescar(self):
+        """Vuelve a leer el catálogo de la base de datos. Si falla se conserva el anterior y se relanza el error."""
+        with self._lock_carga:
+            cambiadas, primera_carga = self._recargar()
+        if cambiadas and not primera_carga and self._al_cambiar:
+            self._al_cambiar(cambiadas)
+        return cambiadas
+
+    def _recargar(self):
+        # Se llama con _lock_carga tomado
+        try:
+            filas = self._cargar()
+        except Exception as ex:
+            self.ultimo_error = str(ex)
+            raise
+
+        columnas_por_vista = {}
+        for nombre, columna, data_type, escala in filas:
+            if not IDENTIFICADOR.match(nombre):
+                continue  # No se podría referenciar desde la URL
+            if self._permitidas is not None and nombre.casefold() not in self._permitidas:
+                continue
+            tipo, escala = columna_desde_catalogo(data_type, escala)
+            columnas_por_vista.setdefault(nombre, []).append(Columna(columna, tipo, escala))
+
+        nuevas = {
+            nombre.casefold(): construir_vista(nombre, columnas, self._claves.get(nombre.casefold()))
+            for nombre, columnas in columnas_por_vista.items()
+        }
+        anteriores = self._vistas
+        cambiadas = sorted(
+            (anteriores.get(clave) or nuevas.get(clave)).nombre for clave in anteriores.keys() | nuevas.keys()
+            if anteriores.get(clave) != nuevas.get(clave)
+        )
+        if self._permitidas is not None and self._permitidas - nuevas.keys():
+            logger.warning(f"Vistas permitidas que no existen en la base de datos: {sorted(self._permitidas - nuevas.keys())}")
+
+        # Reemplazo atómico: los lectores nunca ven un catálogo a medio armar
+        self._vistas = nuevas
+        primera_carga = not self._cargado
+        self._cargado = True
+        self.actualizado_en = self._clock()
+        self.ultimo_error = None
+        return cambiadas, primera_carga
+
+    def obtener(self, nombre):
+        """
+        Devuelve la ``Vista`` (con el nombre de INFORMATION_SCHEMA; ``nombre`` no distingue mayúsculas)
+        o lanza VistaNoEncontrada. Solo consulta la base de datos si el catálogo todavía no se pudo
+        cargar (p.ej. la base no respondía al iniciar).
+        """
+        clave = nombre.casefold()
+        if not IDENTIFICADOR.match(nombre) or (self._permitidas is not None and clave not in self._permitidas):
+            raise VistaNoEncontrada(nombre)
+        if not self._cargado:
+            with self._lock_carga:
+                # Otro hilo pudo haberlo cargado mientras se esperaba el lock
+                if not self._cargado:
+                    self._recargar()
+        vista = self._vistas.get(clave)
+        if vista is None:
+            raise VistaNoEncontrada(nombre)
+        return vista
+
+    def vistas(self):
+        """Vistas del catálogo ordenadas por nombre."""
+        return sorted(self._vistas.values(), key=lambda vista: vista.nombre)
+
+    def iniciar_refresco(self, intervalo):
+        """Carga el catálogo en un hilo en segundo plano y lo refresca cada ``intervalo`` segundos (0: solo una vez)."""
+        def refrescar_periodicamente():
+            while True:
+                try:
+                    self.refrescar()
+                except Exception as ex:
+                    logger.warning(f"No se pudo cargar el catálogo de vistas: {ex}")
+                if not intervalo or self._detener.wait(intervalo):
+                    return
+
+        self._hilo = threading.Thread(target=refrescar_periodicamente, name='catalogo-vistas', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def stats(self):
+        return {
+            "cargado": self._cargado,
+            "vistas": len(self._vistas),
+            "permitidas": self._permitidas_config,
+            "actualizado_en": self.actualizado_en,
+            "ultimo_error": self.ultimo_error,
+        }
@@ -0,0 +1,378 @@
+"""
+Construcción de consultas parametrizadas para los reportes.
+
+Traduce los parámetros de la URL (paginación por cursor, proyección de columnas,
+orden y filtros tipados) a SQL parametrizado, validando todo contra las columnas
+reales de la vista. Los valores nunca se interpolan en el SQL; solo los nombres
+de columna ya validados, entre corchetes.
+"""
+import base64
+import binascii
+import json
+import math
+import re
+from collections import namedtuple
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+# Nombres de vista aceptados en la URL (se interpolan en el FROM)
+IDENTIFICADOR = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Columna de la vista que identifica a la empresa (REG_Empresa)
+COLUMNA_EMPRESA = 'Empresa'
+
+# Dialectos SQL soportados (ver backends.py)
+DIALECTOS = ('sqlserver', 'sqlite')
+
+# Parámetros de la URL que activan la construcción de la consulta
+PARAMETROS_CONSULTA = ('limit', 'cursor', 'after', 'columns', 'order_by', 'total')
+
+# Operadores de filtro: <columna>__<operador>=<valor>
+OPERADORES = {
+    'eq': '=',
+    'ne': '<>',
+    'gt': '>',
+    'gte': '>=',
+    'lt': '<',
+    'lte': '<=',
+    'prefix': 'LIKE',
+}
+
+# nombre: nombre de la columna; tipo: tipo normalizado ('int', 'decimal', 'float', 'str',
+# 'date', 'datetime', 'time', 'bool', 'bytes'); escala: decimales (solo para 'decimal')
+Columna = namedtuple('Columna', 'nombre tipo escala')
+
+_TIPOS_PYTHON = (
+    (bool, 'bool'),
+    (int, 'int'),
+    (Decimal, 'decimal'),
+    (float, 'float'),
+    (datetime, 'datetime'),
+    (date, 'date'),
+    (time, 'time'),
+    (str, 'str'),
+    (bytes, 'bytes'),
+    (bytearray, 'bytes'),
+)
+
+
+class ParametroInvalido(ValueError):
+    """Parámetro de consulta inválido (columna inexistente, valor mal formado, cursor ajeno...)."""
+
+
+def tipo_desde_python(type_code):
+    """Normaliza el ``type_code`` de ``cursor.description`` (una clase de Python en pyodbc)."""
+    if isinstance(type_code, type):
+        for clase, tipo in _TIPOS_PYTHON:
+            if issubclass(type_code, clase):
+                return tipo
+    return 'str'
+
+
+def columnas_desde_descripcion(description):
+    """Convierte ``cursor.description`` en una lista de ``Columna``."""
+    columnas = []
+    for item in description or []:
+        tipo = tipo_desde_python(item[1])
+        escala = item[5] if tipo == 'decimal' and len(item) > 5 else None
+        columnas.append(Columna(item[0], tipo, escala))
+    return columnas
+
+
+def tiene_parametros(args):
+    """Indica si la petición usa paginación, proyección, orden o filtros."""
+    return any(nombre in args for nombre in PARAMETROS_CONSULTA) or any('__' in nombre for nombre in args)
+
+
+def _finito(valor):
+    """Rechaza NaN e infinitos: no son valores válidos para comparar en SQL y el driver los rechaza."""
+    if isinstance(valor, Decimal) and not valor.is_finite():
+        raise ValueError(valor)
+    if isinstance(valor, float) and not math.isfinite(valor):
+        raise ValueError(valor)
+    return valor
+
+
+def convertir_valor(columna, texto):
+    """Convierte el texto recibido en la URL al tipo de la columna."""
+    try:
+        if columna.tipo == 'int':
+            return int(texto)
+        if columna.tipo == 'decimal':
+            return _finito(Decimal(texto))
+        if columna.tipo == 'float':
+            return _finito(float(texto))
+        if columna.tipo == 'date':
+            return date.fromisoformat(texto)
+        if columna.tipo == 'datetime':
+            return datetime.fromisoformat(texto)
+        if columna.tipo == 'time':
+            return time.fromisoformat(texto)
+        if columna.tipo == 'bool':
+            if texto.lower() not in ('1', '0', 'true', 'false'):
+                raise ValueError(texto)
+            return texto.lower() in ('1', 'true')
+    except (ValueError, InvalidOperation):
+        raise ParametroInvalido(f"Valor inválido para la columna '{columna.nombre}': '{texto}'.")
+    return texto
+
+
+def citar(nombre):
+    """Cita un nombre de columna ya validado: [Nombre]."""
+    return '[' + nombre.replace(']', ']]') + ']'
+
+
+# --- Cursor de paginación (keyset) ---
+
+def _codificar_valor(valor):
+    # Se etiquetan los tipos que JSON no conserva para reconstruirlos exactamente
+    if isinstance(valor, Decimal):
+        return {'d': str(valor)}
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'da': valor.isoformat()}
+    if isinstance(valor, time):
+        return {'t': valor.isoformat()}
+    if isinstance(valor, (bytes, bytearray)):
+        return {'b': base64.b64encode(bytes(valor)).decode('ascii')}
+    return valor
+
+
+def _decodificar_valor(valor):
+    if not isinstance(valor, dict):
+        return _finito(valor)
+    (etiqueta, texto), = valor.items()
+    return _finito({
+        'd': Decimal,
+        'dt': datetime.fromisoformat,
+        'da': date.fromisoformat,
+        't': time.fromisoformat,
+        'b': base64.b64decode,
+    }[etiqueta](texto))
+
+
+def _constante_invalida(nombre):
+    raise ValueError(nombre)
+
+
+def codificar_cursor(orden, valores):
+    """Cursor opaco con la especificación de orden y los valores de la última fila entregada."""
+    contenido = {'o': orden, 'v': [_codificar_valor(v) for v in valores]}
+    texto = json.dumps(contenido, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(texto).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, orden):
+    """Devuelve los valores de la última fila; rechaza cursores creados con otro orden."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        # Sin NaN/Infinity de JSON (ver _finito)
+        contenido = json.loads(texto, parse_constant=_constante_invalida)
+        valores = [_decodificar_valor(v) for v in contenido['v']]
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidOperation):
+        raise ParametroInvalido("Cursor de paginación inválido.")
+    if contenido.get('o') != orden or len(valores) != len(orden):
+        raise ParametroInvalido("El cursor no corresponde al orden/columnas solicitados.")
+    return valores
+
+
+# --- Construcción de la consulta ---
+
+class ConsultaReporte:
+    """
+    Consulta compilada de un reporte. ``sql``/``params`` obtienen la página;
+    ``sql_total``/``params_total`` (opcionales) cuentan las filas que cumplen los filtros.
+    Las columnas de orden que no se proyectaron se agregan al final del SELECT
+    y se recortan con ``visibles``.
+    """
+
+    def __init__(self, sql, params, columnas, visibles, orden, limite, sql_total=None, params_total=None):
+        self.sql = sql
+        self.params = params
+        self.columnas = columnas
+        self.visibles = visibles
+        self.orden = orden
+        self.limite = limite
+        self.sql_total = sql_total
+        self.params_total = params_total
+
+    def paginar(self, filas):
+        """
+        Recibe hasta ``limite + 1`` filas crudas; devuelve las de la página (recortadas a las
+        columnas visibles) y el cursor siguiente, o None si no hay más.
+        """
+        siguiente = None
+        if self.limite is not None and len(filas) > self.limite:
+            filas = filas[:self.limite]
+            indices = {columna.nombre: i for i, columna in enumerate(self.columnas)}
+            ultima = filas[-1]
+            siguiente = codificar_cursor(
+                self.especificacion_orden(),
+                [ultima[indices[columna.nombre]] for columna, _ in self.orden],
+            )
+        return [fila[:self.visibles] for fila in filas], siguiente
+
+    def especificacion_orden(self):
+        return [('-' if desc else '') + columna.nombre for columna, desc in self.orden]
+
+
+def _predicado_keyset(orden, valores):
+    """
+    Filas posteriores a ``valores`` según ``orden``. Considera que SQL Server ordena los NULL
+    primero en ASC y al final en DESC.
+    """
+    terminos, params = [], []
+    iguales, params_iguales = [], []
+    for (columna, desc), valor in zip(orden, valores):
+        nombre = citar(columna.nombre)
+        if valor is None:
+            posterior = None if desc else f"{nombre} IS NOT NULL"
+            posterior_params = []
+        elif desc:
+            posterior = f"({nombre} < ? OR {nombre} IS NULL)"
+            posterior_params = [valor]
+        else:
+            posterior = f"{nombre} > ?"
+            posterior_params = [valor]
+
+        if posterior is not None:
+            terminos.append('(' + ' AND '.join(iguales + [posterior]) + ')')
+            params.extend(params_iguales + posterior_params)
+
+        if valor is None:
+            iguales.append(f"{nombre} IS NULL")
+        else:
+            iguales.append(f"{nombre} = ?")
+            params_iguales.append(valor)
+
+    if not terminos:
+        return '1 = 0', []
+    return '(' + ' OR '.join(terminos) + ')', params
+
+
+def _escapar_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('[', '\\[')
+
+
+def construir_consulta(view_name, columnas_vista, empresa_id, args, limite_maximo=5000, paginar=True,
+                       dialecto='sqlserver', clave=None):
+    """
+    Compila los parámetros de la URL en una ``ConsultaReporte``:
+
+    - ``columns=a,b``: proyección de columnas.
+    - ``order_by=a,-b``: orden (``-`` para descendente).
+    - ``limit=N`` y ``cursor``/``after``: paginación por keyset. Requiere ``clave``, las columnas que
+      identifican a una fila de la vista: se agregan al orden como desempate para que el cursor
+      apunte a una única fila (las columnas proyectadas pueden repetirse entre filas).
+    - ``<columna>__<op>=valor`` con op en eq, ne, gt, gte, lt, lte, prefix: filtros tipados.
+    - ``total=1``: agrega la consulta de conteo.
+
+    Con ``paginar=False`` se obtienen exactamente ``limit`` filas (sin fila de anticipo ni cursor).
+    ``dialecto`` define cómo se limita la cantidad de filas: ``TOP (?)`` en 'sqlserver', ``LIMIT ?`` en 'sqlite'.
+    Sin ``order_by`` ni paginación no se agrega ORDER BY: se conserva el orden de la vista.
+    """
+    if dialecto not in DIALECTOS:
+        raise ValueError(f"Dialecto SQL desconocido: '{dialecto}'.")
+    if not IDENTIFICADOR.match(view_name):
+        raise ParametroInvalido(f"Nombre de vista inválido: '{view_name}'.")
+
+    # Los nombres de columna no distinguen mayúsculas (como en SQL Server); se usa el de la vista
+    por_nombre = {columna.nombre.casefold(): columna for columna in columnas_vista}
+
+    def columna(nombre):
+        if nombre.casefold() not in por_nombre:
+            raise ParametroInvalido(f"La columna '{nombre}' no existe en la vista '{view_name}'.")
+        return por_nombre[nombre.casefold()]
+
+    # 1. Proyección
+    if args.get('columns'):
+        proyectadas = [columna(nombre.strip()) for nombre in args['columns'].split(',') if nombre.strip()]
+    else:
+        proyectadas = list(columnas_vista)
+    if not proyectadas:
+        raise ParametroInvalido("Debe solicitar al menos una columna.")
+
+    # 2. Paginación
+    limite = None
+    if args.get('limit') is not None:
+        try:
+            limite = int(args['limit'])
+        except ValueError:
+            raise ParametroInvalido("limit debe ser un entero.")
+        if not 1 <= limite <= limite_maximo:
+            raise ParametroInvalido(f"limit debe estar entre 1 y {limite_maximo}.")
+
+    cursor = args.get('cursor') or args.get('after')
+    paginada = bool(cursor) or (limite is not None and paginar)
+    if paginada and not clave:
+        raise ParametroInvalido(
+            f"La vista '{view_name}' no admite paginación (limit/cursor): no tiene una clave única configurada."
+        )
+
+    # 3. Orden (en la paginación, con desempate por la clave única)
+    orden = []
+    for item in (args.get('order_by') or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        desc = item.startswith('-')
+        orden.append((columna(item.lstrip('-')), desc))
+    if paginada:
+        ya_ordenadas = {col.nombre for col, _ in orden}
+        orden.extend((columna(nombre), False) for nombre in clave if nombre not in ya_ordenadas)
+
+    seleccionadas = proyectadas + [col for col, _ in orden if col not in proyectadas]
+
+    # 4. Filtros
+    empresa = por_nombre.get(COLUMNA_EMPRESA.casefold())
+    condiciones = [f"{citar(empresa.nombre if empresa else COLUMNA_EMPRESA)} = ?"]
+    params_filtro = [empresa_id]
+    for parametro, valor in args.items(multi=True):
+        if '__' not in parametro:
+            continue
+        nombre, _, operador = parametro.rpartition('__')
+        if operador not in OPERADORES:
+            raise ParametroInvalido(f"Operador de filtro desconocido: '{operador}'.")
+        col = columna(nombre)
+        if operador == 'prefix':
+            condiciones.append(f"{citar(col.nombre)} LIKE ? ESCAPE '\\'")
+            params_filtro.append(_escapar_like(valor) + '%')
+        else:
+            condiciones.append(f"{citar(col.nombre)} {OPERADORES[operador]} ?")
+            params_filtro.append(convertir_valor(col, valor))
+
+    condiciones_pagina = list(condiciones)
+    params_pagina = list(params_filtro)
+    if cursor:
+        especificacion = [('-' if desc else '') + col.nombre for col, desc in orden]
+        valores = decodificar_cursor(cursor, especificacion)
+        predicado, params_keyset = _predicado_keyset(orden, valores)
+        condiciones_pagina.append(predicado)
+        params_pagina.extend(params_keyset)
+
+    lista_columnas = ', '.join(citar(col.nombre) for col in seleccionadas)
+    sql = f"FROM dbo.{view_name} WHERE {' AND '.join(condiciones_pagina)}"
+    # Sin paginación ni orden explícito no hace falta que la base de datos ordene
+    if orden:
+        sql += ' ORDER BY ' + ', '.join(citar(col.nombre) + (' DESC' if desc else ' ASC') for col, desc in orden)
+
+    if limite is not None and dialecto == 'sqlite':
+        sql = f"SELECT {lista_columnas} {sql} LIMIT ?"
+        params = params_pagina + [limite + 1 if paginar else limite]
+    elif limite is not None:
+        sql = f"SELECT TOP (?) {lista_columnas} {sql}"
+        params = [limite + 1 if paginar else limite] + params_pagina
+    else:
+        sql = f"SELECT {lista_columnas} {sql}"
+        params = params_pagina
+
+    sql_total = params_total = None
+    if (args.get('total') or '').lower() in ('1', 'true'):
+        sql_total = f"SELECT COUNT(*) FROM dbo.{view_name} WHERE {' AND '.join(condiciones)}"
+        params_total = params_filtro
+
+    return ConsultaReporte(
+        sql, params, seleccionadas, len(proyectadas), orden,
+        limite if paginar else None, sql_total, params_total,
+    )
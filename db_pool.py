@@ -0,0 +1,247 @@
+"""
+Pool de conexiones DB-API acotado y seguro para hilos.
+
+Reemplaza el patrón "conectar -> consultar -> cerrar" por conexiones reutilizables,
+evitando repetir el handshake TCP + TLS + login contra Azure SQL en cada petición.
+La fábrica de conexiones es inyectable (p.ej. ``lambda: sqlite3.connect(...)``),
+por lo que el pool no depende de pyodbc.
+"""
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexión libre antes de vencer el tiempo de espera."""
+
+
+class PoolCerradoError(Exception):
+    """Se intentó usar un pool que ya fue cerrado."""
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones con tamaño mínimo/máximo, tiempo de espera al solicitar,
+    desalojo de conexiones inactivas, verificación de vida (ping) al entregar
+    y descarte de conexiones que fallaron durante su uso.
+    """
+
+    # Estadísticas acumuladas desde la creación del pool (solo crecen)
+    CONTADORES = ("creadas", "cerradas", "descartadas", "solicitudes", "esperas", "timeouts", "pings_fallidos")
+
+    def __init__(self, factory, min_size=0, max_size=10, timeout=30.0,
+                 max_idle=300.0, ping_interval=30.0, ping_query="SELECT 1",
+                 clock=time.monotonic):
+        if max_size < 1:
+            raise ValueError("max_size debe ser >= 1")
+        if not 0 <= min_size <= max_size:
+            raise ValueError("min_size debe estar entre 0 y max_size")
+
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+        self.ping_query = ping_query
+        self._clock = clock
+
+        self._cond = threading.Condition(threading.Lock())
+        # Conexiones libres como (conexion, instante_de_devolucion); las más recientes a la derecha
+        self._libres = collections.deque()
+        self._total = 0
+        self._en_uso = 0
+        self._cerrado = False
+        self._contadores = collections.Counter()
+
+    # --- Entrega y devolución de conexiones ---
+
+    def acquire(self, timeout=None):
+        """
+        Obtiene una conexión del pool, creando una nueva si hay cupo.
+        Lanza PoolAgotadoError si no hay conexión disponible dentro de ``timeout`` segundos.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        limite = self._clock() + timeout
+
+        while True:
+            conn, devuelta_en, crear, desalojadas = self._reservar(limite)
+            self._cerrar_todas(desalojadas)
+
+            if crear:
+                try:
+                    conn = self._factory()
+                except Exception:
+                    self._liberar_cupo()
+                    raise
+                self._contar("creadas")
+                return conn
+
+            # Verificación de vida solo si la conexión estuvo inactiva un buen rato
+            if self.ping_interval is not None and self._clock() - devuelta_en >= self.ping_interval:
+                if not self._ping(conn):
+                    self._contar("pings_fallidos")
+                    self._descartar(conn)
+                    continue
+            return conn
+
+    def release(self, conn, discard=False):
+        """
+        Devuelve una conexión al pool. Con ``discard=True`` (o si el rollback falla)
+        la conexión se cierra en lugar de reutilizarse.
+        """
+        if not discard:
+            try:
+                # Deja la conexión sin transacción abierta antes de reutilizarla
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if not discard and not self._cerrado:
+                self._en_uso -= 1
+                self._libres.append((conn, self._clock()))
+                self._cond.notify()
+                return
+
+        self._descartar(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager: entrega una conexión y la descarta si el bloque lanza una excepción."""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    # --- Mantenimiento ---
+
+    def prefill(self):
+        """Abre conexiones hasta alcanzar ``min_size`` (útil al arrancar la aplicación)."""
+        while True:
+            with self._cond:
+                if self._cerrado or self._total >= self.min_size:
+                    return
+                self._total += 1
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+            self._contar("creadas")
+            with self._cond:
+                self._libres.append((conn, self._clock()))
+                self._cond.notify()
+
+    def close(self):
+        """Cierra las conexiones libres; las que estén en uso se cierran al devolverse."""
+        with self._cond:
+            self._cerrado = True
+            libres = [conn for conn, _ in self._libres]
+            self._libres.clear()
+            self._total -= len(libres)
+            self._cond.notify_all()
+        self._cerrar_todas(libres)
+
+    def stats(self):
+        """Devuelve un resumen del estado actual del pool."""
+        with self._cond:
+            resumen = {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "total": self._total,
+                "en_uso": self._en_uso,
+                "libres": len(self._libres),
+                "cerrado": self._cerrado,
+            }
+            for nombre in self.CONTADORES:
+                resumen[nombre] = self._contadores[nombre]
+        return resumen
+
+    # --- Internos ---
+
+    def _reservar(self, limite):
+        """Reserva una conexión libre o un cupo para crearla. Devuelve también las conexiones a desalojar."""
+        with self._cond:
+            self._contadores["solicitudes"] += 1
+            esperando = False
+            while True:
+                if self._cerrado:
+                    raise PoolCerradoError("El pool de conexiones está cerrado.")
+
+                desalojadas = self._desalojar_inactivas()
+
+                if self._libres:
+                    conn, devuelta_en = self._libres.pop()
+                    self._en_uso += 1
+                    return conn, devuelta_en, False, desalojadas
+
+                if self._total < self.max_size:
+                    self._total += 1
+                    self._en_uso += 1
+                    return None, None, True, desalojadas
+
+                restante = limite - self._clock()
+                if restante <= 0:
+                    self._contadores["timeouts"] += 1
+                    raise PoolAgotadoError(
+                        f"No hay conexiones disponibles (max_size={self.max_size}) tras esperar {self.timeout}s."
+                    )
+                if not esperando:
+                    self._contadores["esperas"] += 1
+                    esperando = True
+                self._cond.wait(restante)
+
+    def _desalojar_inactivas(self):
+        """Retira (con el lock tomado) las conexiones libres inactivas más allá de ``max_idle``."""
+        if self.max_idle is None:
+            return []
+        vencimiento = self._clock() - self.max_idle
+        desalojadas = []
+        # Las más antiguas están a la izquierda; se respeta min_size
+        while self._libres and self._total > self.min_size and self._libres[0][1] <= vencimiento:
+            conn, _ = self._libres.popleft()
+            self._total -= 1
+            desalojadas.append(conn)
+        return desalojadas
+
+    def _ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conn):
+        self._contar("descartadas")
+        self._liberar_cupo()
+        self._cerrar_todas([conn])
+
+    def _liberar_cupo(self):
+        with self._cond:
+            self._total -= 1
+            self._en_uso -= 1
+            self._cond.notify()
+
+    def _cerrar_todas(self, conexiones):
+        for conn in conexiones:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._contar("cerradas")
+
+    def _contar(self, nombre):
+        with self._cond:
+            self._contadores[nombre] += 1
@@ -0,0 +1,440 @@
+"""
+Exportación de reportes en el servidor (CSV, XLSX y PDF).
+
+Cada exportador recibe las columnas (``Columna``) y un iterable de lotes de filas
+crudas (el generador de ``iterar_select_query``) y produce el archivo por partes,
+de modo que la memoria se mantiene constante sin importar la cantidad de filas.
+"""
+import csv
+import io
+import math
+import re
+import zipfile
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+# Formatos numéricos de Excel para las celdas tipadas
+FORMATO_MONEDA = '#,##0.00'
+FORMATO_FECHA = 'yyyy-mm-dd'
+FORMATO_FECHA_HORA = 'yyyy-mm-dd hh:mm:ss'
+
+
+# --- CSV ---
+
+def exportar_csv(columnas, lotes, titulo=None):
+    """CSV en UTF-8 (con BOM para que Excel respete los acentos); un fragmento por lote."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    escritor.writerow([columna.nombre for columna in columnas])
+    for lote in lotes:
+        # csv convierte cada valor con str(): los decimales se escriben exactos
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# --- XLSX ---
+
+_NS_HOJA = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_RELACIONES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+    '<Relationship Id="rId2" Target="styles.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+    '</Relationships>'
+)
+
+# Estilos de celda (índice en cellXfs): 0 general, 1 moneda, 2 fecha, 3 fecha y hora, 4 encabezado en negrita
+_ESTILO_MONEDA, _ESTILO_FECHA, _ESTILO_FECHA_HORA, _ESTILO_ENCABEZADO = 1, 2, 3, 4
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    f'<styleSheet xmlns="{_NS_HOJA}">'
+    '<numFmts count="3">'
+    f'<numFmt numFmtId="164" formatCode="{FORMATO_MONEDA}"/>'
+    f'<numFmt numFmtId="165" formatCode="{FORMATO_FECHA}"/>'
+    f'<numFmt numFmtId="166" formatCode="{FORMATO_FECHA_HORA}"/>'
+    '</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+# Día 0 del sistema de fechas de Excel (incluye el 29/02/1900 ficticio)
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+_CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _SalidaEnMemoria:
+    """Destino de escritura no posicionable: zipfile escribe aquí y el generador lo vacía por partes."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+def _texto_xml(valor):
+    return escape(_CARACTERES_INVALIDOS_XML.sub('', str(valor)))
+
+
+def _celda_texto(valor):
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{_texto_xml(valor)}</t></is></c>'
+
+
+def _celda_numero(valor):
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return _celda_texto(valor)
+    return f'<c><v>{valor}</v></c>'
+
+
+def _celda_moneda(valor):
+    # El texto del Decimal se escribe tal cual: el valor llega exacto a Excel
+    return f'<c s="{_ESTILO_MONEDA}"><v>{valor}</v></c>'
+
+
+def _celda_fecha(valor):
+    return f'<c s="{_ESTILO_FECHA}"><v>{(valor - _EPOCA_EXCEL.date()).days}</v></c>'
+
+
+def _celda_fecha_hora(valor):
+    serial = (valor.replace(tzinfo=None) - _EPOCA_EXCEL) / timedelta(days=1)
+    return f'<c s="{_ESTILO_FECHA_HORA}"><v>{serial!r}</v></c>'
+
+
+def _celda_booleano(valor):
+    return f'<c t="b"><v>{int(bool(valor))}</v></c>'
+
+
+def _escritor_celda(columna):
+    escritor = {
+        'int': _celda_numero,
+        'float': _celda_numero,
+        'decimal': _celda_moneda,
+        'date': _celda_fecha,
+        'datetime': _celda_fecha_hora,
+        'bool': _celda_booleano,
+    }.get(columna.tipo, _celda_texto)
+
+    def escribir(valor):
+        if valor is None:
+            return '<c/>'
+        try:
+            return escritor(valor)
+        except (TypeError, AttributeError, ValueError):
+            # Tipo inesperado en la columna (p.ej. bases sin tipos estrictos): se escribe como texto
+            return _celda_texto(valor)
+
+    return escribir
+
+
+def exportar_xlsx(columnas, lotes, titulo=None):
+    """
+    XLSX con celdas tipadas: números nativos, moneda (#,##0.00) para decimales y fechas reales.
+    La hoja se escribe directamente dentro del ZIP (cadenas en línea, sin tabla compartida)
+    y cada lote comprimido se entrega de inmediato, así que la memoria no crece con las filas.
+    """
+    nombre_hoja = _texto_xml((titulo or 'Reporte')[:31])
+    escritores = [_escritor_celda(columna) for columna in columnas]
+    salida = _SalidaEnMemoria()
+
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        archivo_zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archivo_zip.writestr('_rels/.rels', _RELS)
+        archivo_zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archivo_zip.writestr('xl/styles.xml', _STYLES)
+        archivo_zip.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{_NS_HOJA}" xmlns:r="{_NS_RELACIONES}">'
+            f'<sheets><sheet name="{nombre_hoja}" sheetId="1" r:id="rId1"/></sheets></workbook>',
+        )
+        yield salida.vaciar()
+
+        with archivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            encabezado = ''.join(
+                f'<c s="{_ESTILO_ENCABEZADO}" t="inlineStr"><is><t>{_texto_xml(columna.nombre)}</t></is></c>'
+                for columna in columnas
+            )
+            hoja.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<worksheet xmlns="{_NS_HOJA}">'
+                # Encabezado fijo al desplazarse
+                '<sheetViews><sheetView workbookViewId="0">'
+                '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+                '</sheetView></sheetViews>'
+                f'<sheetData><row>{encabezado}</row>'
+            ).encode('utf-8'))
+
+            for lote in lotes:
+                hoja.write(''.join(
+                    '<row>' + ''.join([escribir(valor) for escribir, valor in zip(escritores, fila)]) + '</row>'
+                    for fila in lote
+                ).encode('utf-8'))
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+
+            hoja.write(b'</sheetData></worksheet>')
+
+    yield salida.vaciar()
+
+
+# --- PDF ---
+
+# A4 horizontal en puntos, fuente monoespaciada (Courier: ancho de carácter = 0.6 * tamaño)
+ANCHO_PAGINA, ALTO_PAGINA = 842, 595
+MARGEN = 28
+TAMANO_FUENTE = 7
+ALTO_LINEA = 9
+ANCHO_CARACTER = 0.6 * TAMANO_FUENTE
+ANCHO_MAXIMO_COLUMNA = 40
+# Los textos que no caben se recortan y terminan en este carácter (existe en WinAnsiEncoding)
+ELIPSIS = '\u2026'
+_TIPOS_NUMERICOS = ('int', 'decimal', 'float')
+
+
+def exportar_pdf(columnas, lotes, titulo=None):
+    """
+    PDF tabular generado incrementalmente: cada página se escribe (comprimida) en cuanto
+    se completa, y al final solo se agregan el árbol de páginas y la tabla xref.
+    """
+    return _EscritorPDF(columnas, titulo or 'Reporte').generar(lotes)
+
+
+class _EscritorPDF:
+    """Escritor PDF mínimo (texto en Courier) que no retiene las páginas ya emitidas."""
+
+    def __init__(self, columnas, titulo):
+        self.columnas = columnas
+        self.titulo = titulo
+        self.offsets = {}
+        self.posicion = 0
+        self.paginas = []
+        # 1: catálogo, 2: árbol de páginas (se escribe al final), 3 y 4: fuentes
+        self.siguiente_objeto = 5
+        self.filas_por_pagina = int((ALTO_PAGINA - 2 * MARGEN - 3 * ALTO_LINEA) // ALTO_LINEA)
+        self.anchos = None
+        # Las columnas numéricas se alinean a la derecha y sus valores nunca se recortan
+        self.numericas = [columna.tipo in _TIPOS_NUMERICOS for columna in columnas]
+
+    def generar(self, lotes):
+        yield self._emitir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self._objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        yield self._objeto(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>')
+        yield self._objeto(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>')
+
+        pendientes = []
+        for crudas in lotes:
+            lote = [[self._texto(columna, valor) for columna, valor in zip(self.columnas, fila)] for fila in crudas]
+            if self.anchos is None:
+                # El ancho de las columnas se calcula con el encabezado y el primer lote
+                self._detectar_numericas(crudas)
+                self.anchos = self._calcular_anchos(lote)
+            else:
+                self._ensanchar_numericas(lote)
+            pendientes.extend(lote)
+            while len(pendientes) >= self.filas_por_pagina:
+                yield self._pagina(pendientes[:self.filas_por_pagina])
+                del pendientes[:self.filas_por_pagina]
+
+        if self.anchos is None:
+            self.anchos = self._calcular_anchos([])
+        if pendientes or not self.paginas:
+            yield self._pagina(pendientes)
+
+        kids = b' '.join(b'%d 0 R' % numero for numero in self.paginas)
+        yield self._objeto(2, b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(self.paginas))
+        yield self._xref()
+
+    # --- Internos ---
+
+    def _emitir(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+    def _objeto(self, numero, contenido):
+        self.offsets[numero] = self.posicion
+        return self._emitir(b'%d 0 obj\n' % numero + contenido + b'\nendobj\n')
+
+    def _pagina(self, filas):
+        numero_contenido = self.siguiente_objeto
+        numero_pagina = self.siguiente_objeto + 1
+        self.siguiente_objeto += 2
+        self.paginas.append(numero_pagina)
+
+        contenido = zlib.compress(self._contenido_pagina(filas, len(self.paginas)))
+        datos = self._objeto(
+            numero_contenido,
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(contenido) + contenido + b'\nendstream',
+        )
+        datos += self._objeto(
+            numero_pagina,
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] ' % (ANCHO_PAGINA, ALTO_PAGINA)
+            + b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>' % numero_contenido,
+        )
+        return datos
+
+    def _contenido_pagina(self, filas, numero_pagina):
+        y = ALTO_PAGINA - MARGEN
+        lineas = [
+            (b'F2', 10, y, f"{self.titulo}    Página {numero_pagina}"),
+            (b'F2', TAMANO_FUENTE, y - 2 * ALTO_LINEA, self._linea([c.nombre for c in self.columnas], encabezado=True)),
+        ]
+        y -= 3 * ALTO_LINEA
+        for fila in filas:
+            lineas.append((b'F1', TAMANO_FUENTE, y, self._linea(fila)))
+            y -= ALTO_LINEA
+
+        partes = [b'BT']
+        for fuente, tamano, posicion_y, texto in lineas:
+            partes.append(
+                b'/%s %d Tf 1 0 0 1 %d %d Tm (%s) Tj' % (fuente, tamano, MARGEN, posicion_y, _escapar_pdf(texto))
+            )
+        partes.append(b'ET')
+        return b'\n'.join(partes)
+
+    def _linea(self, valores, encabezado=False):
+        celdas = []
+        for valor, ancho, numerica in zip(valores, self.anchos, self.numericas):
+            if numerica:
+                # Un importe recortado sería una cifra distinta: si no cabe, desplaza el resto de la línea
+                celdas.append(valor.ljust(ancho) if encabezado else valor.rjust(ancho))
+                continue
+            if len(valor) > ancho:
+                valor = valor[:ancho - 1] + ELIPSIS
+            celdas.append(valor.ljust(ancho))
+        return ' '.join(celdas)
+
+    def _detectar_numericas(self, filas):
+        # Columnas sin tipo numérico en el catálogo (p.ej. expresiones) cuyos valores son números
+        for i, columna in enumerate(self.columnas):
+            if self.numericas[i]:
+                continue
+            valor = next((fila[i] for fila in filas if fila[i] is not None), None)
+            self.numericas[i] = isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool)
+
+    def _ensanchar_numericas(self, filas):
+        # Los lotes siguientes pueden traer importes más largos que los del primero
+        for i, numerica in enumerate(self.numericas):
+            if numerica:
+                self.anchos[i] = max([self.anchos[i]] + [len(fila[i]) for fila in filas])
+
+    def _calcular_anchos(self, filas):
+        anchos = [len(columna.nombre) for columna in self.columnas]
+        for fila in filas:
+            anchos = [max(ancho, len(valor)) for ancho, valor in zip(anchos, fila)]
+        anchos = [
+            max(ancho, _ancho_numerico(columna)) if numerica else min(ancho, ANCHO_MAXIMO_COLUMNA)
+            for ancho, columna, numerica in zip(anchos, self.columnas, self.numericas)
+        ]
+
+        # Si no caben en la página se reducen proporcionalmente solo las columnas de texto
+        disponible = int((ANCHO_PAGINA - 2 * MARGEN) / ANCHO_CARACTER) - len(anchos)
+        disponible -= sum(ancho for ancho, numerica in zip(anchos, self.numericas) if numerica)
+        total = sum(ancho for ancho, numerica in zip(anchos, self.numericas) if not numerica)
+        if total > disponible:
+            anchos = [
+                ancho if numerica else max(4, ancho * max(disponible, 0) // total)
+                for ancho, numerica in zip(anchos, self.numericas)
+            ]
+        return anchos
+
+    @staticmethod
+    def _texto(columna, valor):
+        if valor is None:
+            return ''
+        if isinstance(valor, Decimal):
+            # Con la escala de la columna, o todos los dígitos del valor si no se conoce
+            return f"{valor:,.{columna.escala}f}" if columna.escala is not None else f"{valor:,f}"
+        if isinstance(valor, (date, datetime)):
+            return valor.isoformat(sep=' ') if isinstance(valor, datetime) else valor.isoformat()
+        return str(valor)
+
+    def _xref(self):
+        inicio = self.posicion
+        total = self.siguiente_objeto
+        lineas = [b'xref', b'0 %d' % total, b'0000000000 65535 f ']
+        lineas.extend(b'%010d 00000 n ' % self.offsets[numero] for numero in range(1, total))
+        lineas.append(b'trailer')
+        lineas.append(b'<< /Size %d /Root 1 0 R >>' % total)
+        lineas.append(b'startxref')
+        lineas.append(b'%d' % inicio)
+        lineas.append(b'%%EOF')
+        return self._emitir(b'\n'.join(lineas) + b'\n')
+
+
+def _ancho_numerico(columna):
+    """Ancho reservado según el tipo: hasta 99.999 millones con separadores, más los decimales."""
+    if columna.tipo == 'int':
+        return 11
+    return 15 + 1 + (columna.escala if columna.escala is not None else 2)
+
+
+def _escapar_pdf(texto):
+    datos = texto.encode('cp1252', errors='replace')
+    return datos.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+# Formato -> (exportador, mimetype, extensión)
+EXPORTADORES = {
+    'csv': (exportar_csv, 'text/csv', 'csv'),  # Flask agrega '; charset=utf-8' a los tipos text/*
+    'xlsx': (exportar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'pdf': (exportar_pdf, 'application/pdf', 'pdf'),
+}
@@ -0,0 +1,195 @@
+"""
+Formatos compactos y tipados para las respuestas de reportes.
+
+El formato por defecto devuelve un diccionario de strings por fila. El formato
+columnar envía los metadatos de las columnas una sola vez y las filas como arrays
+con valores nativos:
+
+- Enteros y flotantes como números JSON.
+- Decimales como enteros escalados: ``1234.50`` con ``scale: 2`` viaja como ``123450``
+  (exacto y compacto). Si el valor no cabe en un entero seguro de JavaScript (2^53)
+  se envía como string con el valor exacto.
+- Fechas y horas en ISO 8601; binarios en base64.
+
+También hay codificaciones binarias opcionales (MessagePack y Arrow IPC) que solo
+se ofrecen si la librería correspondiente está instalada.
+"""
+import base64
+import json
+from decimal import Decimal
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional
+    msgpack = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Dependencia opcional
+    pyarrow = None
+
+# Mayor entero representable exactamente en un Number de JavaScript
+MAX_ENTERO_SEGURO = 2 ** 53 - 1
+
+MIMETYPE_JSON = 'application/json'
+MIMETYPE_MSGPACK = 'application/msgpack'
+MIMETYPE_ARROW = 'application/vnd.apache.arrow.stream'
+
+
+def codificaciones_disponibles():
+    """Mimetypes que se pueden negociar con la cabecera Accept (JSON primero: es el valor por defecto)."""
+    disponibles = [MIMETYPE_JSON]
+    if msgpack is not None:
+        disponibles.append(MIMETYPE_MSGPACK)
+    if pyarrow is not None:
+        disponibles.append(MIMETYPE_ARROW)
+    return disponibles
+
+
+# --- Conversión de valores ---
+
+def _escala_de(valor):
+    exponente = valor.as_tuple().exponent
+    return -exponente if isinstance(exponente, int) and exponente < 0 else 0
+
+
+def resolver_escalas(columnas, filas):
+    """
+    Completa la escala de las columnas decimales que no la traen en ``cursor.description``,
+    usando la mayor cantidad de decimales presente en los datos.
+    """
+    resueltas = []
+    for i, columna in enumerate(columnas):
+        if columna.tipo == 'decimal' and columna.escala is None:
+            escala = max((_escala_de(fila[i]) for fila in filas if isinstance(fila[i], Decimal)), default=0)
+            columna = columna._replace(escala=escala)
+        resueltas.append(columna)
+    return resueltas
+
+
+def _convertidor_decimal(escala):
+    if escala is None:
+        return str
+
+    factor = 10 ** escala
+
+    def convertir(valor):
+        # as_integer_ratio es la forma más barata de obtener el entero escalado exacto
+        numerador, denominador = valor.as_integer_ratio()
+        if factor % denominador == 0:
+            escalado = numerador * (factor // denominador)
+            if -MAX_ENTERO_SEGURO <= escalado <= MAX_ENTERO_SEGURO:
+                return escalado
+        # Fuera del rango seguro (o con más decimales que la escala): valor exacto como texto
+        return str(valor)
+
+    return convertir
+
+
+def _convertidor(columna):
+    if columna.tipo == 'decimal':
+        return _convertidor_decimal(columna.escala)
+    if columna.tipo in ('date', 'datetime', 'time'):
+        return lambda valor: valor.isoformat()
+    if columna.tipo == 'bytes':
+        return lambda valor: base64.b64encode(bytes(valor)).decode('ascii')
+    if columna.tipo in ('int', 'float', 'bool'):
+        return None
+    # 'str' (o tipo desconocido): se conservan los valores nativos que JSON admite
+    return lambda valor: valor if isinstance(valor, (str, int, float)) else str(valor)
+
+
+def metadatos_columnas(columnas):
+    """Metadatos enviados una sola vez: nombre, tipo y, para decimales, la escala."""
+    metadatos = []
+    for columna in columnas:
+        item = {"name": columna.nombre, "type": columna.tipo}
+        if columna.tipo == 'decimal':
+            item["scale"] = columna.escala
+        metadatos.append(item)
+    return metadatos
+
+
+def filas_columnares(columnas, filas):
+    """Convierte las filas crudas en arrays de valores JSON nativos."""
+    convertidores = [_convertidor(columna) for columna in columnas]
+    if not any(convertidores):
+        return [list(fila) for fila in filas]
+    return [
+        [valor if valor is None or convertir is None else convertir(valor)
+         for convertir, valor in zip(convertidores, fila)]
+        for fila in filas
+    ]
+
+
+# --- Codificación de la respuesta completa ---
+
+def reporte_columnar(resultado):
+    """Construye el documento columnar a partir del resultado crudo de la consulta."""
+    columnas = resolver_escalas(resultado["columnas"], resultado["filas"])
+    documento = {
+        "status": "success",
+        "query": resultado["query"],
+        "columns": metadatos_columnas(columnas),
+        "rows": filas_columnares(columnas, resultado["filas"]),
+    }
+    for clave in ("next_cursor", "total"):
+        if clave in resultado:
+            documento[clave] = resultado[clave]
+    return documento
+
+
+def codificar_json(documento):
+    return json.dumps(documento, separators=(',', ':')).encode('utf-8')
+
+
+def codificar_msgpack(documento):
+    return msgpack.packb(documento, use_bin_type=True)
+
+
+def _tipo_arrow(columna):
+    # Para 'str' (también el tipo desconocido) se deja que Arrow infiera el tipo de los valores
+    return {
+        'int': pyarrow.int64(),
+        'float': pyarrow.float64(),
+        'bool': pyarrow.bool_(),
+        'decimal': pyarrow.decimal128(38, columna.escala or 0),
+        'date': pyarrow.date32(),
+        'datetime': pyarrow.timestamp('us'),
+        'time': pyarrow.time64('us'),
+        'bytes': pyarrow.binary(),
+    }.get(columna.tipo)
+
+
+def codificar_arrow(resultado):
+    """
+    Codifica el resultado crudo como un stream Arrow IPC (tipos nativos, decimales exactos).
+    El cursor y el total viajan en los metadatos del esquema.
+    """
+    columnas = resolver_escalas(resultado["columnas"], resultado["filas"])
+    filas = resultado["filas"]
+    arrays = [
+        pyarrow.array([fila[i] for fila in filas], type=_tipo_arrow(columna))
+        for i, columna in enumerate(columnas)
+    ]
+    metadatos = {
+        clave: json.dumps(resultado[clave]) for clave in ("query", "next_cursor", "total") if clave in resultado
+    }
+    tabla = pyarrow.Table.from_arrays(arrays, names=[c.nombre for c in columnas], metadata=metadatos)
+
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, tabla.schema) as writer:
+        writer.write_table(tabla)
+    return sink.getvalue().to_pybytes()
+
+
+def serializar_columnar(resultado, mimetype=MIMETYPE_JSON):
+    """Serializa el resultado crudo en formato columnar con la codificación indicada."""
+    if mimetype == MIMETYPE_ARROW:
+        return codificar_arrow(resultado)
+    documento = reporte_columnar(resultado)
+    if mimetype == MIMETYPE_MSGPACK:
+        return codificar_msgpack(documento)
+    return codificar_json(documento)
+
@@ -0,0 +1,319 @@
+"""
+Métricas de rendimiento de los endpoints.
+
+Cada petición lleva una ``Medicion`` (en un ContextVar) donde el código de acceso a
+datos anota la duración de sus fases (acquire, connect, execute, fetch, count, convert,
+serialize), las filas leídas y los bytes enviados. Al terminar la petición la
+medición se acumula en histogramas por endpoint y vista, que se exponen en formato
+de texto de Prometheus junto con los percentiles p50/p95/p99.
+
+Con las métricas deshabilitadas no se crea ninguna medición y ``fase()`` devuelve
+un context manager vacío compartido, así que el costo es una lectura del ContextVar.
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los buckets de los histogramas de duración
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# Orden de las fases en la cabecera Server-Timing (las demás van al final)
+ORDEN_FASES = ('acquire', 'connect', 'execute', 'fetch', 'count', 'convert', 'serialize')
+
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+class _FaseNula:
+    """Context manager vacío (métricas deshabilitadas o fuera de una petición medida)."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_FASE_NULA = _FaseNula()
+
+
+class _Fase:
+    __slots__ = ('medicion', 'nombre', 'inicio')
+
+    def __init__(self, medicion, nombre):
+        self.medicion = medicion
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.medicion.agregar_fase(self.nombre, time.perf_counter() - self.inicio)
+        return False
+
+
+class Medicion:
+    """Tiempos y volúmenes de una petición (o de una parte de un lote)."""
+
+    __slots__ = ('endpoint', 'vista', 'inicio', 'fases', 'filas', 'bytes', 'notas')
+
+    def __init__(self, endpoint, vista=''):
+        self.endpoint = endpoint
+        self.vista = vista
+        self.inicio = time.perf_counter()
+        self.fases = {}
+        self.filas = 0
+        self.bytes = 0
+        self.notas = {}
+
+    def agregar_fase(self, nombre, duracion):
+        # Una fase puede repetirse (p.ej. fetch por lotes): se acumula
+        self.fases[nombre] = self.fases.get(nombre, 0.0) + duracion
+
+    def transcurrido(self):
+        return time.perf_counter() - self.inicio
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing (duraciones en milisegundos)."""
+        nombres = [f for f in ORDEN_FASES if f in self.fases] + [f for f in self.fases if f not in ORDEN_FASES]
+        partes = [f"{nombre};dur={self.fases[nombre] * 1000:.2f}" for nombre in nombres]
+        partes.extend(f'{nombre};desc="{descripcion}"' for nombre, descripcion in self.notas.items())
+        partes.append(f"total;dur={self.transcurrido() * 1000:.2f}")
+        return ', '.join(partes)
+
+
+class _Histograma:
+    __slots__ = ('buckets', 'suma', 'cantidad')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # El último es +Inf
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(BUCKETS):
+            if valor <= limite:
+                break
+        else:
+            i = len(BUCKETS)
+        self.buckets[i] += 1
+        self.suma += valor
+        self.cantidad += 1
+
+    def percentil(self, q):
+        """Estimación por interpolación lineal dentro del bucket (como histogram_quantile de Prometheus)."""
+        if not self.cantidad:
+            return math.nan
+        objetivo = q * self.cantidad
+        acumulado = 0
+        for i, cantidad in enumerate(self.buckets):
+            if cantidad and acumulado + cantidad >= objetivo:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]  # Por encima del último límite: no se puede interpolar
+                inferior = BUCKETS[i - 1] if i else 0.0
+                return inferior + (BUCKETS[i] - inferior) * (objetivo - acumulado) / cantidad
+            acumulado += cantidad
+        return BUCKETS[-1]
+
+
+def _escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(**valores):
+    return ','.join(f'{clave}="{_escapar_etiqueta(valor)}"' for clave, valor in valores.items())
+
+
+def _numero(valor):
+    if isinstance(valor, float) and math.isnan(valor):
+        return 'NaN'
+    return repr(float(valor)) if isinstance(valor, float) else str(int(valor))
+
+
+class Metricas:
+    """
+    Registro de métricas en memoria, seguro para usar desde varios hilos.
+
+    ``umbral_lento`` (segundos) activa el log de consultas lentas, que funciona aunque
+    las métricas estén deshabilitadas.
+    """
+
+    def __init__(self, habilitado=True, umbral_lento=None, prefijo='reportes'):
+        self.habilitado = habilitado
+        self.umbral_lento = umbral_lento
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._duraciones = {}   # (endpoint, vista) -> _Histograma
+        self._fases = {}        # (endpoint, vista, fase) -> _Histograma
+        self._peticiones = {}   # (endpoint, vista, estado) -> cantidad
+        self._filas = {}        # (endpoint, vista) -> total de filas
+        self._bytes = {}        # (endpoint, vista) -> total de bytes
+        self._consultas_lentas = 0
+
+    # --- Registro durante la petición ---
+
+    def iniciar(self, endpoint, vista=''):
+        """Crea la medición de la petición en curso; devuelve ``(medicion, token)`` o ``(None, None)`` si está deshabilitado."""
+        if not self.habilitado:
+            return None, None
+        medicion = Medicion(endpoint, vista)
+        return medicion, _medicion_actual.set(medicion)
+
+    def soltar(self, token):
+        """Quita la medición del contexto (no la registra; ver ``finalizar``)."""
+        if token is not None:
+            _medicion_actual.reset(token)
+
+    def actual(self):
+        return _medicion_actual.get()
+
+    def fase(self, nombre, medicion=None):
+        """Context manager que suma la duración del bloque a la fase ``nombre`` de la medición en curso."""
+        medicion = medicion or _medicion_actual.get()
+        if medicion is None:
+            return _FASE_NULA
+        return _Fase(medicion, nombre)
+
+    def contar_filas(self, cantidad, medicion=None):
+        medicion = medicion or _medicion_actual.get()
+        if medicion is not None:
+            medicion.filas += cantidad
+
+    def etiquetar(self, vista):
+        """Asigna la vista a la medición en curso (solo vistas del catálogo, para acotar las etiquetas)."""
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.vista = vista
+
+    def anotar(self, nombre, descripcion):
+        """Agrega una entrada descriptiva (sin duración) a la cabecera Server-Timing."""
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.notas[nombre] = descripcion
+
+    def consulta_finalizada(self, sql, params, duracion, medicion=None):
+        """Registra en el log las consultas que superan el umbral, con la vista y los parámetros."""
+        if self.umbral_lento is None or duracion < self.umbral_lento:
+            return
+        medicion = medicion or _medicion_actual.get()
+        with self._lock:
+            self._consultas_lentas += 1
+        logger.warning(
+            f"Consulta lenta ({duracion * 1000:.0f} ms) "
+            f"endpoint={medicion.endpoint if medicion else '-'} vista={medicion.vista if medicion else '-'} "
+            f"params={list(params or [])!r} sql={sql}"
+        )
+
+    def finalizar(self, medicion, estado):
+        """Acumula la medición terminada en los histogramas y contadores."""
+        if medicion is None:
+            return
+        duracion = medicion.transcurrido()
+        clave = (medicion.endpoint, medicion.vista)
+        with self._lock:
+            self._duraciones.setdefault(clave, _Histograma()).observar(duracion)
+            for nombre, valor in medicion.fases.items():
+                self._fases.setdefault(clave + (nombre,), _Histograma()).observar(valor)
+            clave_estado = clave + (estado,)
+            self._peticiones[clave_estado] = self._peticiones.get(clave_estado, 0) + 1
+            self._filas[clave] = self._filas.get(clave, 0) + medicion.filas
+            self._bytes[clave] = self._bytes.get(clave, 0) + medicion.bytes
+
+    def contar_bytes(self, fragmentos, medicion):
+        """Envuelve el cuerpo de una respuesta transmitida para sumar los bytes enviados."""
+        try:
+            for fragmento in fragmentos:
+                medicion.bytes += len(fragmento)
+                yield fragmento
+        finally:
+            if hasattr(fragmentos, 'close'):
+                fragmentos.close()
+
+    # --- Exportación ---
+
+    def percentiles(self):
+        """Percentiles de la duración total por endpoint y vista (segundos)."""
+        with self._lock:
+            return {
+                clave: {q: histograma.percentil(q) for q in PERCENTILES}
+                for clave, histograma in self._duraciones.items()
+            }
+
+    def prometheus(self):
+        """Líneas en formato de texto de Prometheus con todas las métricas acumuladas."""
+        p = self.prefijo
+        lineas = []
+        with self._lock:
+            self._histogramas_prometheus(
+                lineas, f"{p}_request_duration_seconds", "Duración total de la petición.",
+                {_etiquetas(endpoint=e, vista=v): h for (e, v), h in self._duraciones.items()},
+            )
+            self._histogramas_prometheus(
+                lineas, f"{p}_phase_duration_seconds", "Duración de cada fase de la petición.",
+                {_etiquetas(endpoint=e, vista=v, fase=f): h for (e, v, f), h in self._fases.items()},
+            )
+
+            lineas.append(f"# HELP {p}_request_duration_quantile_seconds Percentiles estimados de la duración total.")
+            lineas.append(f"# TYPE {p}_request_duration_quantile_seconds gauge")
+            for (e, v), histograma in sorted(self._duraciones.items()):
+                for q in PERCENTILES:
+                    etiquetas = _etiquetas(endpoint=e, vista=v, quantile=q)
+                    lineas.append(f"{p}_request_duration_quantile_seconds{{{etiquetas}}} {_numero(histograma.percentil(q))}")
+
+            contadores = (
+                (f"{p}_requests_total", "Peticiones atendidas por estado HTTP.",
+                 {_etiquetas(endpoint=e, vista=v, status=s): n for (e, v, s), n in self._peticiones.items()}),
+                (f"{p}_rows_total", "Filas leídas de la base de datos.",
+                 {_etiquetas(endpoint=e, vista=v): n for (e, v), n in self._filas.items()}),
+                (f"{p}_response_bytes_total", "Bytes enviados en el cuerpo de las respuestas.",
+                 {_etiquetas(endpoint=e, vista=v): n for (e, v), n in self._bytes.items()}),
+                (f"{p}_slow_queries_total", "Consultas que superaron el umbral de consulta lenta.",
+                 {'': self._consultas_lentas}),
+            )
+        for nombre, ayuda, valores in contadores:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} counter")
+            for etiquetas, valor in sorted(valores.items()):
+                lineas.append(f"{nombre}{{{etiquetas}}} {valor}" if etiquetas else f"{nombre} {valor}")
+        return lineas
+
+    @staticmethod
+    def _histogramas_prometheus(lineas, nombre, ayuda, histogramas):
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} histogram")
+        for etiquetas, histograma in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, cantidad in zip(BUCKETS + ('+Inf',), histograma.buckets):
+                acumulado += cantidad
+                lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f"{nombre}_sum{{{etiquetas}}} {histograma.suma!r}")
+            lineas.append(f"{nombre}_count{{{etiquetas}}} {histograma.cantidad}")
+
+
+def estadisticas_prometheus(nombre_base, ayuda, stats, contadores=()):
+    """
+    Convierte un diccionario de estadísticas (p.ej. pool.stats()) en métricas de Prometheus; omite
+    los valores no numéricos. Las claves de ``contadores`` (acumulados que solo crecen) se publican
+    como ``counter`` con sufijo ``_total``, para poder usar rate(); el resto como ``gauge``.
+    """
+    lineas = []
+    for clave, valor in sorted(stats.items()):
+        if isinstance(valor, bool):
+            valor = int(valor)
+        if not isinstance(valor, (int, float)):
+            continue
+        if clave in contadores:
+            nombre, tipo = f"{nombre_base}_{clave}_total", 'counter'
+        else:
+            nombre, tipo = f"{nombre_base}_{clave}", 'gauge'
+        lineas.append(f"# HELP {nombre} {ayuda} ({clave}).")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        lineas.append(f"{nombre} {_numero(valor)}")
+    return lineas
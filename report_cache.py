@@ -0,0 +1,173 @@
+"""
+Caché en proceso de respuestas de reportes.
+
+Guarda el cuerpo ya serializado de cada reporte, acotado por tamaño en bytes,
+con expiración por TTL y desalojo LRU. Las consultas concurrentes para la misma
+clave se agrupan en una sola ejecución (single-flight).
+"""
+import collections
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class CacheEntry:
+    """Respuesta cacheada: cuerpo serializado más los metadatos para ETag/Last-Modified."""
+
+    __slots__ = ("cuerpo", "mimetype", "etag", "last_modified", "expira_en", "tamano")
+
+    def __init__(self, cuerpo, mimetype, expira_en):
+        self.cuerpo = cuerpo
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(cuerpo).hexdigest()
+        # HTTP solo tiene resolución de segundos
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.expira_en = expira_en
+        self.tamano = len(cuerpo)
+
+
+class _Vuelo:
+    """Carga en curso para una clave; los demás hilos esperan su resultado."""
+
+    __slots__ = ("evento", "entrada", "error")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.entrada = None
+        self.error = None
+
+
+class ReportCache:
+    """
+    Caché LRU con TTL. Las claves son tuplas ``(view_name, empresa_id, params)``,
+    lo que permite invalidar por vista o por empresa.
+    Con ``ttl <= 0`` o ``max_bytes <= 0`` no se almacena nada, pero se mantiene el single-flight.
+    """
+
+    # Estadísticas acumuladas desde la creación de la caché (solo crecen)
+    CONTADORES = ("hits", "misses", "agrupadas", "expiradas", "desalojadas", "invalidadas")
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=300.0, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entradas = collections.OrderedDict()
+        self._en_vuelo = {}
+        self._bytes = 0
+        # Se incrementa en cada invalidación para no guardar cargas iniciadas antes de ella
+        self._generacion = 0
+        self._contadores = collections.Counter()
+
+    @property
+    def habilitada(self):
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def get(self, clave):
+        """Devuelve la entrada vigente para ``clave`` o None."""
+        with self._lock:
+            return self._obtener(clave)
+
+    def get_or_load(self, clave, loader, mimetype="application/json"):
+        """
+        Devuelve ``(entrada, hit)``. En caso de fallo ejecuta ``loader()`` (que debe devolver
+        el cuerpo en bytes) una sola vez aunque haya varias peticiones concurrentes.
+        Si ``loader`` lanza una excepción, se propaga a todos los que esperaban y no se cachea.
+        """
+        with self._lock:
+            entrada = self._obtener(clave)
+            if entrada is not None:
+                return entrada, True
+
+            vuelo = self._en_vuelo.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+                generacion = self._generacion
+            else:
+                self._contadores["agrupadas"] += 1
+
+        if not lider:
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.entrada, False
+
+        try:
+            cuerpo = loader()
+            vuelo.entrada = CacheEntry(cuerpo, mimetype, self._clock() + self.ttl)
+        except BaseException as ex:
+            vuelo.error = ex
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+                if vuelo.entrada is not None and generacion == self._generacion:
+                    self._guardar(clave, vuelo.entrada)
+            vuelo.evento.set()
+
+        return vuelo.entrada, False
+
+    def invalidate(self, view_name=None, empresa_id=None):
+        """
+        Elimina las entradas de una vista, de una empresa o de ambas.
+        Sin argumentos vacía la caché completa. Devuelve la cantidad de entradas eliminadas.
+        """
+        with self._lock:
+            self._generacion += 1
+            claves = [
+                clave for clave in self._entradas
+                if (view_name is None or clave[0] == view_name)
+                and (empresa_id is None or clave[1] == empresa_id)
+            ]
+            for clave in claves:
+                self._eliminar(clave)
+            self._contadores["invalidadas"] += len(claves)
+        return len(claves)
+
+    def stats(self):
+        with self._lock:
+            resumen = {
+                "habilitada": self.habilitada,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+            }
+            for nombre in self.CONTADORES:
+                resumen[nombre] = self._contadores[nombre]
+        return resumen
+
+    # --- Internos (requieren el lock tomado) ---
+
+    def _obtener(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self._contadores["misses"] += 1
+            return None
+        if entrada.expira_en <= self._clock():
+            self._eliminar(clave)
+            self._contadores["expiradas"] += 1
+            self._contadores["misses"] += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self._contadores["hits"] += 1
+        return entrada
+
+    def _guardar(self, clave, entrada):
+        if not self.habilitada or entrada.tamano > self.max_bytes:
+            return
+        if clave in self._entradas:
+            self._eliminar(clave)
+        self._entradas[clave] = entrada
+        self._bytes += entrada.tamano
+        # Desalojo LRU hasta volver al límite de memoria
+        while self._bytes > self.max_bytes:
+            clave_antigua = next(iter(self._entradas))
+            self._eliminar(clave_antigua)
+            self._contadores["desalojadas"] += 1
+
+    def _eliminar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self._bytes -= entrada.tamano
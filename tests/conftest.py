@@ -0,0 +1,26 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Los módulos de la aplicación están en la raíz del repositorio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture(scope='session')
+def aplicacion(tmp_path_factory):
+    """La aplicación Flask sobre una base SQLite local pequeña (app.py se configura al importarse)."""
+    from base_local import crear_base_local
+
+    ruta = str(tmp_path_factory.mktemp('base') / 'reportes.sqlite')
+    crear_base_local(ruta, empresas=2, cuentas=5, movimientos=4)
+    os.environ.update(DB_BACKEND='sqlite', DB_SQLITE_PATH=ruta)
+    modulo = importlib.import_module('app')
+    modulo.app.config['TESTING'] = True
+    return modulo
+
+
+@pytest.fixture
+def cliente(aplicacion):
+    return aplicacion.app.test_client()
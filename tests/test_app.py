@@ -0,0 +1,71 @@
+"""Pruebas de los endpoints de reportes contra la base SQLite local."""
+import json
+import time
+
+import pytest
+
+VISTA = '/api/reporte-vista/view_Movimientos_Cuentas'
+
+
+def lineas_ndjson(respuesta):
+    return [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('order_by', ['-Empresa', 'Debe', '-Fecha,Concepto'])
+def test_ndjson_columnar_recorta_las_columnas_de_orden(cliente, order_by):
+    respuesta = cliente.get(f'{VISTA}?empresa_id=1&format=ndjson&layout=columnar&columns=Id&order_by={order_by}')
+    assert respuesta.status_code == 200
+    encabezado, *filas = lineas_ndjson(respuesta)
+    assert encabezado['columns'] == [{'name': 'Id', 'type': 'int'}]
+    assert len(filas) == 20
+    assert all(len(fila) == 1 and isinstance(fila[0], int) for fila in filas)
+
+
+def test_stream_columnar_recorta_las_columnas_de_orden(cliente):
+    respuesta = cliente.get(f'{VISTA}?empresa_id=1&format=stream&layout=columnar&columns=Id,Cuenta&order_by=-Debe')
+    assert respuesta.status_code == 200
+    documento = json.loads(respuesta.get_data(as_text=True))
+    assert [c['name'] for c in documento['columns']] == ['Id', 'Cuenta']
+    assert {len(fila) for fila in documento['rows']} == {2}
+
+
+def test_ndjson_rows_recorta_las_columnas_de_orden(cliente):
+    respuesta = cliente.get(f'{VISTA}?empresa_id=1&format=ndjson&columns=Cuenta&order_by=Debe')
+    encabezado, *filas = lineas_ndjson(respuesta)
+    assert encabezado['columns'] == ['Cuenta']
+    assert all(list(fila) == ['Cuenta'] for fila in filas)
+
+
+def test_cliente_lento_no_cuenta_como_consulta_lenta(aplicacion, cliente, monkeypatch):
+    monkeypatch.setattr(aplicacion.metricas, 'umbral_lento', 0.05)
+    monkeypatch.setattr(aplicacion, 'STREAM_BATCH_SIZE', 5)
+    antes = aplicacion.metricas._consultas_lentas
+
+    respuesta = cliente.get(f'{VISTA}?empresa_id=1&format=ndjson', buffered=False)
+    for _ in respuesta.response:
+        time.sleep(0.02)  # El cliente descarga despacio: más de 0.05 s en total
+    respuesta.close()
+
+    assert aplicacion.metricas._consultas_lentas == antes
+
+
+@pytest.mark.parametrize('formato, tipo', [
+    ('csv', 'text/csv; charset=utf-8'),
+    ('pdf', 'application/pdf'),
+])
+def test_exportacion_content_type(cliente, formato, tipo):
+    respuesta = cliente.get(f'{VISTA}/export?empresa_id=1&format={formato}')
+    assert respuesta.status_code == 200
+    assert respuesta.headers['Content-Type'] == tipo
+
+
+@pytest.mark.parametrize('empresa_ids', [[1e400], [True], [1.7], ['1.5'], [None], [[1]]])
+def test_lote_rechaza_empresa_ids_no_enteros(cliente, empresa_ids):
+    respuesta = cliente.post('/api/reportes', json={"vistas": ["view_Balance_Comprobacion"], "empresa_ids": empresa_ids})
+    assert respuesta.status_code == 400
+
+
+def test_lote_acepta_enteros_y_strings_de_digitos(cliente):
+    respuesta = cliente.post('/api/reportes', json={"vistas": ["view_Balance_Comprobacion"], "empresa_ids": [1, "2"]})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()["status"] == 'success'
@@ -0,0 +1,143 @@
+"""
+Pruebas de construir_consulta. La paginación por keyset se recorre completa contra una
+vista SQLite con filas repetidas y NULL: la unión de las páginas debe ser exactamente el
+resultado sin paginar.
+"""
+import base64
+import json
+import sqlite3
+from collections import Counter
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from consultas import Columna, ParametroInvalido, construir_consulta
+
+COLUMNAS = [
+    Columna('Id', 'int', None),
+    Columna('Empresa', 'int', None),
+    Columna('Cuenta', 'str', None),
+    Columna('Fecha', 'str', None),
+    Columna('Concepto', 'str', None),
+    Columna('Debe', 'float', None),
+]
+CLAVE = ('Id',)
+
+
+@pytest.fixture(scope='module')
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("ATTACH DATABASE ':memory:' AS dbo")
+    conn.execute(
+        "CREATE TABLE dbo.Movimientos (Id INTEGER PRIMARY KEY, Empresa INTEGER, Cuenta TEXT, "
+        "Fecha TEXT, Concepto TEXT, Debe REAL)"
+    )
+    conn.execute("CREATE VIEW dbo.view_Movimientos AS SELECT Id, Empresa, Cuenta, Fecha, Concepto, Debe FROM Movimientos")
+    filas = []
+    for i in range(120):
+        filas.append((1, f"1{i % 4}", f"2024-01-{i % 7 + 1:02d}", None if i % 5 == 0 else f"C{i % 3}", float(i % 6)))
+    # Asientos idénticos (misma cuenta, fecha, concepto e importe), habituales en un libro real
+    filas += [(1, '10', '2024-01-01', 'Dup', 12.5)] * 20
+    filas += [(2, '10', '2024-01-01', 'Otra empresa', 1.0)] * 5
+    conn.executemany(
+        "INSERT INTO dbo.Movimientos (Empresa, Cuenta, Fecha, Concepto, Debe) VALUES (?, ?, ?, ?, ?)", filas,
+    )
+    yield conn
+    conn.close()
+
+
+def ejecutar(conn, consulta):
+    filas = conn.execute(consulta.sql, consulta.params).fetchall()
+    return consulta.paginar(filas)
+
+
+def recorrer(conn, args, limite):
+    """Pide todas las páginas siguiendo el cursor; devuelve las filas y la cantidad de páginas."""
+    filas, cursor, paginas = [], None, 0
+    while True:
+        parametros = MultiDict(dict(args, limit=str(limite)))
+        if cursor:
+            parametros['cursor'] = cursor
+        consulta = construir_consulta('view_Movimientos', COLUMNAS, 1, parametros, dialecto='sqlite', clave=CLAVE)
+        pagina, cursor = ejecutar(conn, consulta)
+        assert len(pagina) <= limite
+        filas += pagina
+        paginas += 1
+        if cursor is None:
+            return filas, paginas
+
+
+@pytest.mark.parametrize('args', [
+    {},
+    {'columns': 'Cuenta'},
+    {'columns': 'Cuenta,Concepto', 'order_by': '-Concepto'},
+    {'order_by': 'Concepto'},
+    {'order_by': 'Fecha,-Debe'},
+    {'columns': 'Debe', 'order_by': '-Debe,Cuenta'},
+    {'columns': 'Cuenta,Debe', 'Debe__gte': '2'},
+])
+@pytest.mark.parametrize('limite', [1, 3, 7, 500])
+def test_paginacion_keyset_completa(conn, args, limite):
+    completo = construir_consulta('view_Movimientos', COLUMNAS, 1, MultiDict(args), dialecto='sqlite', clave=CLAVE)
+    esperado, _ = ejecutar(conn, completo)
+
+    filas, paginas = recorrer(conn, args, limite)
+
+    # Ni filas perdidas ni repetidas entre páginas
+    assert Counter(filas) == Counter(esperado)
+    # La fila de anticipo evita pedir una última página vacía
+    assert paginas == max(1, -(-len(esperado) // limite))
+
+
+def test_paginacion_respeta_el_orden_pedido(conn):
+    filas, _ = recorrer(conn, {'columns': 'Debe,Id', 'order_by': '-Debe'}, 9)
+    assert filas == sorted(filas, key=lambda fila: (-fila[0], fila[1]))
+
+
+def test_paginacion_sin_clave_es_rechazada():
+    for args in ({'limit': '10'}, {'cursor': 'abc'}):
+        with pytest.raises(ParametroInvalido):
+            construir_consulta('view_Movimientos', COLUMNAS, 1, MultiDict(args), dialecto='sqlite')
+
+
+def test_limite_sin_paginar_no_requiere_clave():
+    consulta = construir_consulta(
+        'view_Movimientos', COLUMNAS, 1, MultiDict({'limit': '10'}), paginar=False, dialecto='sqlite',
+    )
+    assert 'ORDER BY' not in consulta.sql
+
+
+def test_sin_order_by_conserva_el_orden_de_la_vista():
+    consulta = construir_consulta('view_Movimientos', COLUMNAS, 1, MultiDict({'columns': 'Cuenta'}), clave=CLAVE)
+    assert 'ORDER BY' not in consulta.sql
+
+
+def test_paginacion_ordena_solo_por_la_clave():
+    consulta = construir_consulta('view_Movimientos', COLUMNAS, 1, MultiDict({'limit': '5'}), clave=CLAVE)
+    assert consulta.sql.endswith('ORDER BY [Id] ASC')
+    assert consulta.sql.startswith('SELECT TOP (?)')
+
+
+def test_columnas_sin_distinguir_mayusculas():
+    columnas = [Columna('EMPRESA', 'int', None)] + COLUMNAS[2:]
+    consulta = construir_consulta('view_Movimientos', columnas, 1, MultiDict({'columns': 'cuenta', 'DEBE__gt': '1'}))
+    assert consulta.sql == "SELECT [Cuenta] FROM dbo.view_Movimientos WHERE [EMPRESA] = ? AND [Debe] > ?"
+
+
+@pytest.mark.parametrize('valor', ['NaN', 'nan', 'Infinity', '-inf'])
+def test_rechaza_numeros_no_finitos_en_filtros(valor):
+    columnas = COLUMNAS + [Columna('Haber', 'decimal', 2)]
+    for columna in ('Debe', 'Haber'):
+        with pytest.raises(ParametroInvalido):
+            construir_consulta('view_Movimientos', columnas, 1, MultiDict({f'{columna}__gt': valor}))
+
+
+@pytest.mark.parametrize('valor', [{'d': 'NaN'}, {'d': '-Infinity'}, 'NaN'])
+def test_rechaza_numeros_no_finitos_en_el_cursor(valor):
+    contenido = json.dumps({'o': ['Debe', 'Id'], 'v': [valor, 1]}).replace('"NaN"', 'NaN')
+    cursor = base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+    with pytest.raises(ParametroInvalido):
+        construir_consulta(
+            'view_Movimientos', COLUMNAS, 1, MultiDict({'limit': '5', 'order_by': 'Debe', 'cursor': cursor}),
+            clave=CLAVE,
+        )
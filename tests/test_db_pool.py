@@ -0,0 +1,144 @@
+"""Pruebas del pool de conexiones con sqlite3 como fábrica y un reloj controlado."""
+import sqlite3
+
+import pytest
+
+from db_pool import ConnectionPool, PoolAgotadoError
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def crear_pool(**opciones):
+    reloj = opciones.pop('clock', None) or Reloj()
+    fabrica = lambda: sqlite3.connect(':memory:', check_same_thread=False)  # noqa: E731
+    return ConnectionPool(fabrica, clock=reloj, **opciones), reloj
+
+
+def test_reutiliza_la_conexion_devuelta():
+    pool, _ = crear_pool(max_size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()['creadas'] == 1
+
+
+def test_timeout_al_solicitar_lanza_pool_agotado():
+    # Reloj real: la espera debe vencer
+    pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), max_size=1)
+    conn = pool.acquire()
+    with pytest.raises(PoolAgotadoError):
+        pool.acquire(timeout=0.05)
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['esperas'] == 1
+    pool.release(conn)
+    assert pool.acquire(timeout=0.05) is conn
+
+
+def test_desaloja_inactivas_respetando_min_size():
+    pool, reloj = crear_pool(min_size=1, max_size=3, max_idle=300, ping_interval=None)
+    conexiones = [pool.acquire() for _ in range(3)]
+    for conn in conexiones:
+        pool.release(conn)
+    assert pool.stats()['libres'] == 3
+
+    reloj.ahora = 1000
+    conn = pool.acquire()
+    stats = pool.stats()
+    # Se cierran las dos más antiguas; la que queda (min_size) se entrega
+    assert stats['total'] == 1
+    assert stats['cerradas'] == 2
+    assert conn is conexiones[-1]
+
+
+def test_no_desaloja_antes_de_max_idle():
+    pool, reloj = crear_pool(max_size=2, max_idle=300, ping_interval=None)
+    a, b = pool.acquire(), pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    reloj.ahora = 299
+    pool.acquire()
+    assert pool.stats()['total'] == 2
+    assert pool.stats()['cerradas'] == 0
+
+
+def test_ping_fallido_descarta_la_conexion():
+    pool, reloj = crear_pool(max_size=1, ping_interval=30, max_idle=None)
+    vieja = pool.acquire()
+    pool.release(vieja)
+    vieja.close()  # La base de datos cerró la conexión mientras estaba libre
+
+    reloj.ahora = 31
+    nueva = pool.acquire()
+    assert nueva is not vieja
+    nueva.execute("SELECT 1")
+    stats = pool.stats()
+    assert stats['pings_fallidos'] == 1
+    assert stats['descartadas'] == 1
+    assert stats['creadas'] == 2
+    assert stats['total'] == 1
+
+
+def test_sin_ping_si_la_conexion_estuvo_poco_inactiva():
+    pool, reloj = crear_pool(max_size=1, ping_interval=30)
+    conn = pool.acquire()
+    pool.release(conn)
+    reloj.ahora = 10
+    assert pool.acquire() is conn
+    assert pool.stats()['pings_fallidos'] == 0
+
+
+def test_release_con_discard_cierra_la_conexion():
+    pool, _ = crear_pool(max_size=1)
+    conn = pool.acquire()
+    pool.release(conn, discard=True)
+    stats = pool.stats()
+    assert stats['descartadas'] == 1
+    assert stats['total'] == 0
+    assert stats['en_uso'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+
+def test_error_dentro_del_bloque_descarta_la_conexion():
+    pool, _ = crear_pool(max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("fallo de la consulta")
+    assert pool.stats()['descartadas'] == 1
+    # El cupo se libera: se puede abrir otra
+    assert pool.acquire(timeout=0) is not conn
+
+
+def test_rollback_fallido_descarta_la_conexion():
+    pool, _ = crear_pool(max_size=1)
+    conn = pool.acquire()
+    conn.close()
+    pool.release(conn)
+    assert pool.stats()['descartadas'] == 1
+    assert pool.stats()['libres'] == 0
+
+
+def test_prefill_abre_min_size_conexiones():
+    pool, _ = crear_pool(min_size=2, max_size=4)
+    pool.prefill()
+    stats = pool.stats()
+    assert (stats['total'], stats['libres'], stats['creadas']) == (2, 2, 2)
+    pool.prefill()
+    assert pool.stats()['creadas'] == 2
+
+
+def test_prefill_fallido_libera_el_cupo():
+    def fabrica():
+        raise sqlite3.OperationalError("sin conexión")
+
+    pool = ConnectionPool(fabrica, min_size=1, max_size=1)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.prefill()
+    assert pool.stats()['total'] == 0
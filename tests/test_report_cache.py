@@ -0,0 +1,102 @@
+"""Pruebas de la caché de reportes: single-flight, invalidación por generación, TTL y LRU."""
+import threading
+
+import pytest
+
+from report_cache import ReportCache
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self):
+        return self.ahora
+
+
+def test_single_flight_ejecuta_una_sola_carga():
+    cache = ReportCache(ttl=60)
+    liberar = threading.Event()
+    llamadas = []
+
+    def cargar():
+        llamadas.append(1)
+        liberar.wait(5)
+        return b'{"data": []}'
+
+    resultados = []
+    hilos = [
+        threading.Thread(target=lambda: resultados.append(cache.get_or_load(('v', 1, ()), cargar)))
+        for _ in range(8)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    # Espera a que los demás hilos queden agrupados detrás del primero
+    while cache.stats()['agrupadas'] < 7:
+        threading.Event().wait(0.01)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert len(llamadas) == 1
+    assert len({id(entrada) for entrada, _ in resultados}) == 1
+    assert cache.get_or_load(('v', 1, ()), cargar)[1] is True
+
+
+def test_error_de_carga_se_propaga_y_no_se_cachea():
+    cache = ReportCache(ttl=60)
+
+    def fallar():
+        raise RuntimeError("consulta fallida")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load(('v', 1, ()), fallar)
+    assert cache.get(('v', 1, ())) is None
+    assert cache.get_or_load(('v', 1, ()), lambda: b'ok')[0].cuerpo == b'ok'
+
+
+def test_invalidacion_durante_la_carga_no_guarda_el_resultado():
+    cache = ReportCache(ttl=60)
+    clave = ('v', 1, ())
+
+    def cargar_e_invalidar():
+        # Se contabiliza un asiento mientras la consulta está en curso
+        cache.invalidate(view_name='v')
+        return b'datos viejos'
+
+    entrada, hit = cache.get_or_load(clave, cargar_e_invalidar)
+    assert entrada.cuerpo == b'datos viejos' and not hit
+    assert cache.get(clave) is None
+    assert cache.get_or_load(clave, lambda: b'datos nuevos')[0].cuerpo == b'datos nuevos'
+
+
+def test_invalidar_por_vista_y_empresa():
+    cache = ReportCache(ttl=60)
+    for clave in [('a', 1, ()), ('a', 2, ()), ('b', 1, ())]:
+        cache.get_or_load(clave, lambda: b'x')
+    assert cache.invalidate(view_name='a', empresa_id=1) == 1
+    assert cache.invalidate(empresa_id=1) == 1
+    assert cache.invalidate() == 1
+    assert cache.stats()['entradas'] == 0
+
+
+def test_expira_por_ttl():
+    reloj = Reloj()
+    cache = ReportCache(ttl=10, clock=reloj)
+    cache.get_or_load(('v', 1, ()), lambda: b'x')
+    reloj.ahora = 9
+    assert cache.get(('v', 1, ())) is not None
+    reloj.ahora = 10
+    assert cache.get(('v', 1, ())) is None
+    assert cache.stats()['expiradas'] == 1
+
+
+def test_desalojo_lru_por_bytes():
+    cache = ReportCache(max_bytes=10, ttl=60)
+    cache.get_or_load('a', lambda: b'1234')
+    cache.get_or_load('b', lambda: b'1234')
+    cache.get('a')  # 'b' pasa a ser la menos usada
+    cache.get_or_load('c', lambda: b'1234')
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['desalojadas'] == 1